@@ -1,20 +1,19 @@
 import os
 import json
-import socket
-import requests
+import time
+import codecs
+import queue
+import shutil
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-
-# ==========================================================
-# CHECK INTERNET
-# ==========================================================
-
-def has_internet():
-    try:
-        socket.create_connection(("1.1.1.1", 80), timeout=1)
-        return True
-    except:
-        return False
+from cache_engine import ResponseCache, SingleFlight, FlightCancelled, normalize_prompt, make_key
+from connectivity_engine import is_online
+from local_model_engine import LocalModelClient, LocalModelError, LocalModelUnavailable
+from router_engine import BackendRouter
+from queue_engine import PriorityWorkQueue, Overloaded
+import http_engine
 
 
 # ==========================================================
@@ -22,24 +21,25 @@ def has_internet():
 # ==========================================================
 
 GROQ_KEY = os.getenv("API KEY", "")
+GROQ_MODEL = "llama3-8b-8192"
 
 def groq_ai(prompt):
     if GROQ_KEY == "":
         return "[GROQ ERROR] Missing GROQ_API_KEY"
 
     try:
-        response = requests.post(
+        response = http_engine.post(
+            "groq",
             "https://api.groq.com/openai/v1/chat/completions",
             headers={
                 "Authorization": f"Bearer {GROQ_KEY}",
                 "Content-Type": "application/json"
             },
             json={
-                "model": "llama3-8b-8192",
+                "model": GROQ_MODEL,
                 "messages": [{"role": "user", "content": prompt}],
                 "temperature": 0.6
-            },
-            timeout=25
+            }
         )
 
         data = response.json()
@@ -56,16 +56,112 @@ def groq_ai(prompt):
         return f"[GROQ EXCEPTION] {str(e)}"
 
 
+def groq_ai_stream(prompt):
+    """
+    Same request as groq_ai with "stream": true.
+    Yields content deltas as Groq sends them (OpenAI-style SSE).
+    Failures are yielded as a single "[GROQ ...]" chunk.
+    """
+    if GROQ_KEY == "":
+        yield "[GROQ ERROR] Missing GROQ_API_KEY"
+        return
+
+    try:
+        response = http_engine.post(
+            "groq",
+            "https://api.groq.com/openai/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {GROQ_KEY}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": GROQ_MODEL,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": 0.6,
+                "stream": True
+            },
+            stream=True
+        )
+    except Exception as e:
+        yield f"[GROQ EXCEPTION] {str(e)}"
+        return
+
+    try:
+        if response.status_code != 200:
+            try:
+                message = response.json()["error"]["message"]
+            except Exception:
+                message = f"HTTP {response.status_code}"
+            yield f"[GROQ ERROR] {message}"
+            return
+
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+
+            delta = json.loads(payload)["choices"][0].get("delta", {})
+            if delta.get("content"):
+                yield delta["content"]
+
+    except Exception as e:
+        yield f"[GROQ EXCEPTION] {str(e)}"
+
+    finally:
+        response.close()
+
+
 # ==========================================================
 # OLLAMA 2B LOCAL MODEL (FALLBACK)
 # ==========================================================
 
-def local_ai(prompt, model="gemma:2b"):
+LOCAL_MODEL = "gemma:2b"
+
+local_client = LocalModelClient(LOCAL_MODEL)
+
+
+def local_ai(prompt, model=LOCAL_MODEL):
     """
-    Calls Ollama locally.
+    Calls Ollama locally through its HTTP server (model stays warm).
+    Falls back to spawning `ollama run` if the server is not running.
     Must have Ollama installed and model pulled:
        ollama pull gemma:2b
     """
+    if model == local_client.model:
+        try:
+            output = local_client.generate(prompt)["text"]
+            return output if output else "[LOCAL AI ERROR] No output"
+        except LocalModelUnavailable:
+            pass
+        except LocalModelError as e:
+            return f"[LOCAL AI ERROR] {str(e)}"
+
+    return _local_ai_cli(prompt, model)
+
+
+def preload_local_model():
+    """
+    Loads the local model into memory ahead of the first request.
+    Safe to call when Ollama is not running.
+    """
+    try:
+        local_client.preload()
+        return True
+    except LocalModelError:
+        return False
+
+
+def local_model_stats():
+    return local_client.stats()
+
+
+def _local_ai_cli(prompt, model=LOCAL_MODEL):
+    """
+    Last resort: one `ollama run` process per prompt.
+    """
 
     try:
         result = subprocess.run(
@@ -89,29 +185,620 @@ def local_ai(prompt, model="gemma:2b"):
         return f"[LOCAL AI ERROR] {str(e)}"
 
 
+def local_ai_stream(prompt, model=LOCAL_MODEL):
+    """
+    Streams tokens from the Ollama server, or from the CLI
+    if the server is not running.
+    """
+    if model == local_client.model:
+        try:
+            yield from local_client.stream(prompt)
+            return
+        except LocalModelUnavailable:
+            pass
+        except LocalModelError as e:
+            yield f"[LOCAL AI ERROR] {str(e)}"
+            return
+
+    yield from _local_ai_cli_stream(prompt, model)
+
+
+def _local_ai_cli_stream(prompt, model=LOCAL_MODEL, timeout=60):
+    """
+    Streams `ollama run` stdout chunk by chunk instead of
+    waiting for the process to exit.
+    """
+    try:
+        proc = subprocess.Popen(
+            ["ollama", "run", model],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+    except FileNotFoundError:
+        yield "[LOCAL AI ERROR] Ollama not installed"
+        return
+    except Exception as e:
+        yield f"[LOCAL AI ERROR] {str(e)}"
+        return
+
+    # Kill the model if it runs past the timeout; the read loop then sees EOF
+    watchdog = threading.Timer(timeout, proc.kill)
+    watchdog.start()
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    produced = False
+
+    try:
+        proc.stdin.write(prompt.encode("utf-8"))
+        proc.stdin.close()
+
+        while True:
+            chunk = proc.stdout.read1(256)
+            if not chunk:
+                break
+
+            text = decoder.decode(chunk)
+            if text:
+                produced = produced or bool(text.strip())
+                yield text
+
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+        if not produced:
+            yield "[LOCAL AI ERROR] No output"
+
+    except Exception as e:
+        yield f"[LOCAL AI ERROR] {str(e)}"
+
+    finally:
+        watchdog.cancel()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+
+# ==========================================================
+# RESPONSE CACHE
+# ==========================================================
+
+CACHE_PATH = os.path.join("data", "ai_cache.db")
+
+# Seconds a completion stays fresh, per prompt template.
+# Anything not listed (or template=None) uses "default".
+CACHE_TTLS = {
+    "itinerary": 6 * 3600,
+    "packing": 24 * 3600,
+    "culture": 7 * 24 * 3600,
+    "experiences": 24 * 3600,
+    "safety": 3600,
+    "emergency": 600,
+    "journal": 7 * 24 * 3600,
+    "profile": 3600,
+    "cost": 24 * 3600,
+    "distance": 30 * 24 * 3600,
+    "similar": 24 * 3600,
+    "default": 3600,
+}
+
+response_cache = ResponseCache(CACHE_PATH, max_memory=256, max_disk=5000)
+
+# Identical prompts already on their way to a backend share that call
+inflight = SingleFlight()
+
+
+def is_ai_error(text):
+    return "ERROR" in text or "EXCEPTION" in text or "UNKNOWN RESPONSE" in text
+
+
+def cache_key(prompt, backend, model):
+    return make_key(normalize_prompt(prompt), backend, model)
+
+
+def cache_ttl(template):
+    return CACHE_TTLS.get(template or "default", CACHE_TTLS["default"])
+
+
+def invalidate_cache(prompt=None, template=None):
+    """
+    invalidate_cache(prompt=...)   → forget that prompt on every backend
+    invalidate_cache(template=...) → forget a whole template (e.g. "culture")
+    invalidate_cache()             → forget everything
+    """
+    if prompt is not None:
+        return sum(
+            response_cache.invalidate(key=cache_key(prompt, backend, model))
+            for backend, model in (("groq", GROQ_MODEL), ("local", LOCAL_MODEL))
+        )
+    return response_cache.invalidate(tag=template)
+
+
+def cache_stats():
+    return response_cache.stats()
+
+
+def inflight_stats():
+    return inflight.stats()
+
+
+def _cached_call(prompt, template, backend, model, fn):
+    key = cache_key(prompt, backend, model)
+
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+
+    def call():
+        started = time.time()
+        result = fn(prompt)
+        _record(backend, started, result)
+
+        if not is_ai_error(result):
+            response_cache.set(key, result, cache_ttl(template), tag=template or "")
+        return result
+
+    return inflight.do(key, call)
+
+
+# ==========================================================
+# LOCAL MODEL QUEUE
+# ==========================================================
+# The local model generates one completion at a time, so local calls
+# wait in a priority queue in front of a fixed number of workers
+# instead of all hitting Ollama at once. Lower number = served first.
+
+LOCAL_WORKERS = int(os.getenv("LOCAL_AI_WORKERS", "1"))
+
+PRIORITIES = {
+    "emergency": 0,
+    "safety": 1,
+    "journal": 2,
+    "itinerary": 3,
+    "cost": 3,
+    "distance": 3,
+    "similar": 3,
+    "experiences": 4,
+    "culture": 4,
+    "packing": 4,
+    "profile": 5,
+    "default": 3,
+}
+
+local_queue = PriorityWorkQueue("local-ai", workers=LOCAL_WORKERS, max_depth=32, expected_service=15.0)
+
+_STREAM_DONE = object()
+
+
+def _budget(end):
+    return None if end is None else max(0.0, end - time.time())
+
+
+def _local_queued(prompt, priority, end):
+    job = local_queue.submit(lambda: local_ai(prompt), priority, budget=_budget(end))
+    return job.result()
+
+
+def _local_queued_stream(prompt, priority, end, cancel=None):
+    """
+    Holds a worker slot for the whole stream; chunks are handed
+    back to the caller's thread through a small queue.
+    """
+    out = queue.Queue()
+    stop = threading.Event()
+
+    def work():
+        stream = local_ai_stream(prompt)
+        try:
+            for chunk in stream:
+                if stop.is_set():
+                    break
+                out.put(chunk)
+        finally:
+            stream.close()
+            out.put(_STREAM_DONE)
+
+    job = local_queue.submit(work, priority, budget=_budget(end))
+    try:
+        while True:
+            try:
+                item = out.get(timeout=0.25)
+            except queue.Empty:
+                if cancel is not None and cancel.is_set():
+                    return
+                continue
+
+            if item is _STREAM_DONE:
+                break
+            yield item
+
+        job.result()
+    finally:
+        job.cancel()
+        stop.set()
+
+
+def queue_stats():
+    return local_queue.stats()
+
+
+# ==========================================================
+# BACKEND ROUTER
+# ==========================================================
+
+def _probe_groq():
+    resp = http_engine.get(
+        "groq",
+        "https://api.groq.com/openai/v1/models",
+        headers={"Authorization": f"Bearer {GROQ_KEY}"},
+        retries=0,
+        timeout=(3, 5)
+    )
+    resp.close()
+    return resp.status_code == 200
+
+
+def _probe_local():
+    return local_client.ping() or shutil.which("ollama") is not None
+
+
+router = BackendRouter(failure_threshold=3, open_seconds=30)
+router.register(
+    "groq",
+    available=lambda: is_online() and GROQ_KEY != "",
+    probe=_probe_groq,
+    expected_latency=3.0
+)
+router.register("local", probe=_probe_local, expected_latency=15.0)
+
+
+def _backends(template=None, end=None, cancel=None):
+    """
+    backend → (model, call, stream). Local calls go through the
+    priority queue; end (absolute deadline) is the admission budget.
+    """
+    priority = PRIORITIES.get(template or "default", PRIORITIES["default"])
+    return {
+        "groq": (GROQ_MODEL, groq_ai, groq_ai_stream),
+        "local": (
+            LOCAL_MODEL,
+            lambda p: _local_queued(p, priority, end),
+            lambda p: _local_queued_stream(p, priority, end, cancel),
+        ),
+    }
+
+
+def _stale(prompt, backends):
+    for backend in backends:
+        model = _backends()[backend][0]
+        stale = response_cache.get(cache_key(prompt, backend, model), allow_stale=True)
+        if stale is not None:
+            return stale
+    return None
+
+
+def _record(backend, started, result):
+    failed = is_ai_error(result)
+    router.record(
+        backend,
+        time.time() - started,
+        ok=not failed,
+        timeout=failed and "timed out" in result.lower(),
+        error=result if failed else ""
+    )
+
+
+def router_stats():
+    return router.snapshot()
+
+
 # ==========================================================
 # UNIFIED AI — ALWAYS CALL THIS
 # ==========================================================
 
-def ask_ai(prompt):
+def ask_ai(prompt, template=None, deadline=None, hedge_after=None):
     """
-    If internet → use Groq  
-    If offline → use Ollama gemma 2b  
+    Tries backends in the router's order (fastest expected first,
+    broken ones skipped) and falls through on errors:
+      online  → Groq, then Ollama gemma 2b
+      offline → Ollama gemma 2b
+
+    template names the prompt kind ("itinerary", "culture", ...)
+    and picks the cache TTL for the answer.
+
+    deadline (seconds) switches to deadline mode: a failed backend falls
+    through to the next, a blown deadline returns a stale cached answer
+    or the template's fallback text. For latency-critical templates
+    (HEDGE_DELAYS) the next backend is also started if the first has
+    not answered after hedge_after seconds; the first good answer wins.
     """
+    if deadline is not None:
+        return _ask_ai_hedged(prompt, template, deadline, hedge_after)
+
+    backends = _backends(template)
+    order = router.order()
+    result = NO_BACKEND_TEXT
+    busy = None
+
+    for backend in order:
+        model, fn, _ = backends[backend]
+        try:
+            result = _cached_call(prompt, template, backend, model, fn)
+        except Overloaded as e:
+            busy = e
+            continue
 
-    if has_internet() and GROQ_KEY != "":
-        groq_result = groq_ai(prompt)
+        if not is_ai_error(result):
+            return result
 
-        # If Groq fails, fallback to local
-        if "ERROR" not in groq_result and "EXCEPTION" not in groq_result:
-            return groq_result
+    if busy is not None:
+        stale = _stale(prompt, order)
+        if stale is not None:
+            return stale
+        raise busy
 
-        # Groq failed → fallback
-        return local_ai(prompt)
+    return result
 
-    # No internet → local
-    return local_ai(prompt)
 
+# ==========================================================
+# HEDGED REQUESTS (DEADLINE-BOUND CALLS)
+# ==========================================================
+
+AI_TIMEOUT_TEXT = "[AI TIMEOUT] Still generating — please refresh in a moment."
+NO_BACKEND_TEXT = "[LOCAL AI ERROR] No AI backend available"
+
+# Seconds to wait on the primary backend before also asking the next one.
+# Only these latency-critical templates are hedged: a hedge doubles the
+# backend load until the loser notices it was cancelled (see _collect),
+# which isn't worth it for answers the user can wait on.
+HEDGE_DELAYS = {
+    "emergency": 1.5,
+    "safety": 2.0,
+}
+
+# What to answer when the deadline is blown and nothing is cached
+FALLBACK_TEXTS = {
+    "emergency": (
+        "Offline emergency guidance:\n"
+        "- Move to a safe, well-lit public place and stay with other people.\n"
+        "- Call local emergency services (112 in India and the EU, 911 in the US).\n"
+        "- Contact your embassy or consulate if you are abroad.\n"
+        "- Share your live location with someone you trust.\n"
+        "- Keep your phone charged and your ID with you."
+    ),
+    "safety": "Live safety analysis is unavailable right now. Check local advisories and stay in busy, well-known areas.",
+}
+
+# Deadline-bound calls run on two separate pools, so slow bulk routes
+# (itinerary, packing, ...) can't take the threads the hedged safety /
+# emergency calls need.
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ai-hedge")
+_deadline_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ai-deadline")
+
+# A call still running this long after its deadline is cancelled, so
+# stragglers can't pile up in the pool (they fill the cache until then).
+STRAGGLER_GRACE = 30
+
+
+def _collect(stream_fn, prompt, cancel, stop_at):
+    """
+    Drains a backend stream into one string. cancel (and stop_at, an
+    absolute time) is checked between chunks: once hit, the stream is
+    closed (upstream connection / local process) at the next chunk and
+    FlightCancelled is raised, so nothing partial is cached or shared.
+    A backend that hasn't produced its first chunk yet keeps working
+    until it does (or times out).
+    """
+    parts = []
+    stream = stream_fn(prompt)
+    try:
+        for chunk in stream:
+            if cancel.is_set() or time.time() >= stop_at:
+                cancel.set()
+                break
+            parts.append(chunk)
+    finally:
+        stream.close()
+
+    if cancel.is_set():
+        # lost a hedge race or ran out of grace — says nothing about the
+        # backend's health, and coalesced callers must not get this
+        raise FlightCancelled()
+
+    return "".join(parts) or "[LOCAL AI ERROR] No output"
+
+
+def _fallback(prompt, template, backends, error, busy=None):
+    stale = _stale(prompt, backends)
+    if stale is not None:
+        return stale
+
+    if template in FALLBACK_TEXTS:
+        return FALLBACK_TEXTS[template]
+
+    # shed by the local queue and nothing to serve instead → caller sends 429
+    if busy is not None:
+        raise busy
+    return error or AI_TIMEOUT_TEXT
+
+
+def _ask_ai_hedged(prompt, template, deadline, hedge_after):
+    if hedge_after is None:
+        hedge_after = HEDGE_DELAYS.get(template)
+
+    started = time.time()
+    end = started + deadline
+    # not hedged → the next backend only starts when one fails
+    hedge_at = started + hedge_after if hedge_after is not None else float("inf")
+
+    pool = _hedge_pool if hedge_after is not None else _deadline_pool
+    stop_at = end + STRAGGLER_GRACE
+
+    order = router.order()
+    pending = list(order)
+    running = {}              # future -> cancel event
+    # nothing to try at all is not a timeout — say so
+    last_error = None if order else NO_BACKEND_TEXT
+    busy = None
+
+    def launch():
+        backend = pending.pop(0)
+        cancel = threading.Event()
+        model, _, stream_fn = _backends(template, end, cancel)[backend]
+        future = pool.submit(
+            _cached_call, prompt, template, backend, model,
+            lambda p: _collect(stream_fn, p, cancel, stop_at)
+        )
+        running[future] = cancel
+
+    if pending:
+        launch()
+
+    while running:
+        now = time.time()
+        if now >= end:
+            break
+
+        timeout = end - now
+        if pending:
+            timeout = min(timeout, max(0.0, hedge_at - now))
+
+        done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            running.pop(future)
+            try:
+                result = future.result()
+            except Overloaded as e:
+                busy = e
+                result = f"[LOCAL AI ERROR] {str(e)}"
+            except Exception as e:
+                result = f"[AI ERROR] {str(e)}"
+
+            if not is_ai_error(result):
+                # winner — ask the losers to stop (at their next chunk)
+                for cancel in running.values():
+                    cancel.set()
+                return result
+
+            last_error = result
+            if pending:
+                launch()
+
+        if pending and time.time() >= hedge_at:
+            launch()
+
+    # Deadline blown (stragglers keep running for up to STRAGGLER_GRACE
+    # and will fill the cache) or every backend failed.
+    return _fallback(prompt, template, order, last_error, busy)
+
+
+# ==========================================================
+# CONCURRENT FAN-OUT
+# ==========================================================
+
+AI_POOL_SIZE = 8
+
+_ai_pool = ThreadPoolExecutor(max_workers=AI_POOL_SIZE, thread_name_prefix="ask-ai")
+
+
+def run_parallel(calls, deadline=None, fallbacks=None):
+    """
+    calls     : list of (fn, args) pairs
+    deadline  : seconds to wait for the whole batch (None = wait for all)
+    fallbacks : per-call value for calls that miss the deadline or raise
+
+    Returns results in the same order as calls. Calls that miss the
+    deadline keep running in the background (so their answer still
+    lands in the cache for the next request).
+    """
+    if fallbacks is None:
+        fallbacks = [None] * len(calls)
+
+    futures = [_ai_pool.submit(fn, *args) for fn, args in calls]
+    wait(futures, timeout=deadline)
+
+    results = []
+    for future, fallback in zip(futures, fallbacks):
+        if future.done() and future.exception() is None:
+            results.append(future.result())
+        else:
+            results.append(fallback)
+    return results
+
+
+def ask_ai_many(prompts, deadline=None, fallback=AI_TIMEOUT_TEXT, hedge_after=None):
+    """
+    prompts : list of prompt strings or (prompt, template) pairs
+    Runs every prompt concurrently through ask_ai and returns the
+    answers in order; prompts still running at the deadline get fallback.
+    With a deadline each prompt is also hedged (see ask_ai).
+    """
+    calls = []
+    for p in prompts:
+        prompt, template = p if isinstance(p, tuple) else (p, None)
+        calls.append((ask_ai, (prompt, template, deadline, hedge_after)))
+
+    # small slack so each hedged call can hand back its own stale/fallback answer
+    batch_deadline = deadline + 0.5 if deadline is not None else None
+    return run_parallel(calls, deadline=batch_deadline, fallbacks=[fallback] * len(calls))
+
+
+# ==========================================================
+# STREAMING
+# ==========================================================
+
+def _stream_cached(prompt, template, backend, model, stream_fn):
+    """
+    Yields the completion chunk by chunk and writes the full text
+    to the cache once the stream finishes cleanly.
+    If the backend fails before producing anything, nothing is
+    yielded and the error text is returned so the caller can fall back.
+    """
+    key = cache_key(prompt, backend, model)
+
+    cached = response_cache.get(key)
+    if cached is not None:
+        yield cached
+        return None
+
+    started = time.time()
+    parts = []
+    try:
+        for chunk in stream_fn(prompt):
+            if not parts and is_ai_error(chunk):
+                _record(backend, started, chunk)
+                return chunk
+            parts.append(chunk)
+            yield chunk
+    except Overloaded as e:
+        return f"[LOCAL AI ERROR] Busy — try again in {e.retry_after}s"
+
+    full = "".join(parts)
+    _record(backend, started, full)
+    if full and not is_ai_error(full):
+        response_cache.set(key, full, cache_ttl(template), tag=template or "")
+    return None
+
+
+def ask_ai_stream(prompt, template=None):
+    """
+    Streaming twin of ask_ai: same backend choice, same cache,
+    but yields text as soon as the model produces it.
+    """
+    backends = _backends(template)
+    order = router.order()
+    error = "[LOCAL AI ERROR] No AI backend available"
+
+    for backend in order:
+        model, _, stream_fn = backends[backend]
+        error = yield from _stream_cached(prompt, template, backend, model, stream_fn)
+        if error is None:
+            return
+
+    stale = _stale(prompt, order)
+    yield stale if stale is not None else error
 
 
 # ==========================================================
@@ -1,107 +1,281 @@
-import pandas as pd
+import os
+import glob
 import json
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+# ==========================================================
+# GOOGLE FORM UX METRICS
+# ==========================================================
+# Every response sheet (data/google_form*.xlsx) is parsed once: the
+# DataFrame is cached as a pickle and its partial sums (SUS, NPS, TSR,
+# feature counts, ...) are stored in an index keyed by the file's
+# mtime/size and content hash. Adding or editing one sheet only
+# re-parses that sheet; the metrics are recombined from the partials.
+
+FORM_DIR = "data"
+FORM_PATTERN = "google_form*.xlsx"
+CACHE_DIR = os.path.join("analytics", ".form_cache")
+INDEX_FILE = os.path.join(CACHE_DIR, "index.json")
+
+# bump when the partials change shape so old cache entries are ignored
+CACHE_VERSION = 2
+
+# Questions are matched by a distinctive phrase: the sheet's headers
+# carry stray newlines / spaces and slightly different wording.
+COLUMNS = {
+    "tsr": "able to complete the assigned tasks",
+    "errors": "how many errors",
+    "difficulty": "difficulty of completing",
+    "engagement": "how engaging",
+    "features": "which features did you use",
+    "ctr": "click on recommended features",
+    "retention": "return to this tool",
+    "nps": "recommend this system",
+}
+
+# SUS items in questionnaire order (odd = positive, even = negative)
+SUS_COLUMNS = [
+    "use this system frequently",
+    "unnecessarily complex",
+    "easy to use",
+    "technical person",
+    "well integrated",
+    "too much inconsistency",
+    "learn to use this system very quickly",
+    "cumbersome",
+    "confident using the system",
+    "learn a lot of things",
+]
+
+TSR_MAP = {"Yes": 1, "Partially": 0.5, "No": 0}
+ERR_MAP = {"<2": 1, "<5": 3, ">5": 6}
+CTR_MAP = {"Yes": 1, "Sometimes": 0.5, "Rarely": 0.2, "No": 0}
+NPS_SCALE = {1: 2, 2: 4, 3: 6, 4: 8, 5: 10}
+MAX_ERRORS_PER_RESPONSE = 6
+
+_lock = threading.Lock()
+_memo = {"key": None, "result": None}
+
 
 def map_nps_scale(x):
-    mapping = {1: 2, 2: 4, 3: 6, 4: 8, 5: 10}
-    return mapping.get(x, 0)
+    return NPS_SCALE.get(x, 0)
+
+
+# ----------------------------
+# Column lookup
+# ----------------------------
+def _normalize(text):
+    return " ".join(str(text).split()).lower()
+
+
+def _find_column(df, phrase):
+    for col in df.columns:
+        if phrase in _normalize(col):
+            return col
+    raise KeyError(f"no column matching {phrase!r}")
+
+
+# ----------------------------
+# Per-file partials (vectorized)
+# ----------------------------
+def _sum_count(series):
+    values = pd.to_numeric(series, errors="coerce").dropna()
+    return [float(values.sum()), int(values.size)]
+
+
+def partial_metrics(df):
+    """
+    Additive pieces of every metric for one sheet, so several sheets
+    combine without re-reading any of them.
+    """
+    col = {name: _find_column(df, phrase) for name, phrase in COLUMNS.items()}
+
+    sus = df[[_find_column(df, p) for p in SUS_COLUMNS]].apply(pd.to_numeric, errors="coerce").dropna()
+    items = sus.to_numpy(dtype=float)
+    # odd items contribute (v - 1), even items (5 - v); ×2.5 → 0..100
+    sus_scores = ((items[:, 0::2] - 1).sum(axis=1) + (5 - items[:, 1::2]).sum(axis=1)) * 2.5
+
+    nps = pd.to_numeric(df[col["nps"]], errors="coerce").dropna().astype(int).map(map_nps_scale)
+
+    features = (
+        df[col["features"]].dropna().astype(str)
+        .str.split(",").explode().str.strip()
+    )
+    features = features[features != ""].value_counts()
+
+    return {
+        "rows": int(len(df)),
+        "tsr": _sum_count(df[col["tsr"]].map(TSR_MAP)),
+        "errors": _sum_count(df[col["errors"]].map(ERR_MAP)),
+        "difficulty": _sum_count(df[col["difficulty"]]),
+        "sus": [float(sus_scores.sum()), int(sus_scores.size)],
+        "engagement": _sum_count(df[col["engagement"]]),
+        "ctr": _sum_count(df[col["ctr"]].map(CTR_MAP)),
+        "retention": _sum_count(df[col["retention"]]),
+        "nps": {
+            "promoters": int((nps >= 9).sum()),
+            "detractors": int((nps <= 6).sum()),
+            "total": int(nps.size),
+        },
+        "feature_usage": {str(k): int(v) for k, v in features.items()},
+    }
+
+
+def combine(partials):
+    """
+    Turns summed partials into the metric values the admin page shows.
+    """
+    total = {
+        "rows": 0,
+        "nps": {"promoters": 0, "detractors": 0, "total": 0},
+        "feature_usage": {},
+    }
+    for key in ("tsr", "errors", "difficulty", "sus", "engagement", "ctr", "retention"):
+        total[key] = [0.0, 0]
+
+    for p in partials:
+        total["rows"] += p["rows"]
+        for key in ("tsr", "errors", "difficulty", "sus", "engagement", "ctr", "retention"):
+            total[key][0] += p[key][0]
+            total[key][1] += p[key][1]
+        for k in total["nps"]:
+            total["nps"][k] += p["nps"][k]
+        for feature, n in p["feature_usage"].items():
+            total["feature_usage"][feature] = total["feature_usage"].get(feature, 0) + n
+
+    def mean(key, digits=2):
+        s, n = total[key]
+        return round(s / n, digits) if n else 0
+
+    nps = total["nps"]
+    rows = total["rows"]
+
+    return {
+        "tsr": round(mean("tsr", 4) * 100, 2),
+        "uer": round(total["errors"][0] / (rows * MAX_ERRORS_PER_RESPONSE) * 100, 2) if rows else 0,
+        "difficulty": mean("difficulty"),
+        "sus": mean("sus"),
+        "engagement": mean("engagement"),
+        "ctr": mean("ctr"),
+        "retention": mean("retention"),
+        "nps": round((nps["promoters"] - nps["detractors"]) / nps["total"] * 100, 2) if nps["total"] else 0,
+        "feature_usage": total["feature_usage"],
+        "responses": rows,
+    }
+
+
+# ----------------------------
+# Cache
+# ----------------------------
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _load_index():
+    try:
+        with open(INDEX_FILE, "r") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return index if index.get("version") == CACHE_VERSION else {}
+
+
+def _save_index(index):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = INDEX_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, INDEX_FILE)
+
+
+def load_sheet(path, index=None):
+    """
+    DataFrame for one sheet, from the pickle cache when the file's
+    content hash is unchanged.
+    """
+    index = index if index is not None else _load_index()
+    entry = _entry(path, index)
+    return pd.read_pickle(os.path.join(CACHE_DIR, entry["sha256"] + ".pkl"))
+
+
+def _entry(path, index):
+    """
+    Cache entry for one file, (re)building it if needed. mtime+size
+    unchanged → trusted without reading; otherwise the content hash
+    decides whether the sheet really has to be parsed again.
+    """
+    st = os.stat(path)
+    files = index.setdefault("files", {})
+    entry = files.get(path)
+
+    if entry and entry["mtime"] == st.st_mtime and entry["size"] == st.st_size:
+        return entry
+
+    digest = _sha256(path)
+    pickle_path = os.path.join(CACHE_DIR, digest + ".pkl")
+
+    if entry and entry["sha256"] == digest and os.path.exists(pickle_path):
+        entry.update(mtime=st.st_mtime, size=st.st_size)
+        return entry
 
-def compute_google_form_metrics(path):
     df = pd.read_excel(path)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    df.to_pickle(pickle_path)
+
+    entry = {
+        "mtime": st.st_mtime,
+        "size": st.st_size,
+        "sha256": digest,
+        "partials": partial_metrics(df),
+    }
+    files[path] = entry
+    return entry
+
+
+def form_files(folder=FORM_DIR, pattern=FORM_PATTERN):
+    return sorted(glob.glob(os.path.join(folder, pattern)))
+
+
+def compute_google_form_metrics(path=None):
+    """
+    path=None → every response sheet in FORM_DIR combined;
+    path=<file or folder> → just that sheet / folder.
+    """
+    if path is None:
+        paths = form_files()
+    elif os.path.isdir(path):
+        paths = form_files(path)
+    else:
+        paths = [path]
+
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return {}
+
+    # cheap fast path: nothing changed since the last call
+    key = tuple((p, os.stat(p).st_mtime, os.stat(p).st_size) for p in paths)
+
+    with _lock:
+        if _memo["key"] == key:
+            return dict(_memo["result"])
+
+        index = _load_index()
+        index["version"] = CACHE_VERSION
+        entries = [_entry(p, index) for p in paths]
+        _save_index(index)
+
+        result = combine([e["partials"] for e in entries])
+        result["files"] = len(entries)
 
-    results = {}
-
-    # ---------------------------
-    # 1. TSR – Task Success Rate
-    # ---------------------------
-    tsr_map = {"Yes": 1, "Partially": 0.5, "No": 0}
-    tsr_col = df["Were you able to complete the assigned tasks?"]
-    tsr_scores = tsr_col.map(tsr_map)
-    results["tsr"] = round(tsr_scores.mean() * 100, 2)
-
-    # ---------------------------
-    # 2. UER – User Error Rate
-    # ---------------------------
-    err_map = {"<2": 1, "<5": 3, ">5": 6}
-    errors = df["How many errors/difficulties did you face?"].map(err_map)
-    max_actions = len(df) * 6
-    results["uer"] = round((errors.sum() / max_actions) * 100, 2)
-
-    # ---------------------------
-    # 3. Difficulty Score
-    # ---------------------------
-    results["difficulty"] = df["Rate the difficulty of completing the tasks."].mean()
-
-    # ---------------------------
-    # 4. SUS – 10 item scale
-    # ---------------------------
-    sus_cols = [
-        "I think that I would like to use this system frequently.",
-        "I found the system unnecessarily complex.",
-        "I thought the system was easy to use.",
-        "I think that I would need help from a technical person.",
-        "I found the various functions in this system were well integrated.",
-        "I thought there was too much inconsistency in this system.",
-        "I imagine most people would learn to use this system very quickly.",
-        "I found the system very cumbersome to use.",
-        "I felt very confident using the system.",
-        "I needed to learn a lot of things before I could get going.",
-    ]
-
-    sus_raw = df[sus_cols].astype(int)
-    sus_scores = []
-
-    for _, row in sus_raw.iterrows():
-        score = 0
-        for i, v in enumerate(row):
-            if (i + 1) % 2 == 1:
-                score += (v - 1)
-            else:
-                score += (5 - v)
-        sus_scores.append(score * 2.5)
-
-    results["sus"] = round(sum(sus_scores) / len(sus_scores), 2)
-
-    # ---------------------------
-    # 5. Engagement
-    # ---------------------------
-    results["engagement"] = df["How engaging did you find the system?"].mean()
-
-    # ---------------------------
-    # 6. CTR
-    # ---------------------------
-    ctr_map = {"Yes": 1, "Sometimes": 0.5, "Rarely": 0.2, "No": 0}
-    results["ctr"] = df["Did you click on recommended features when suggested (CTR)?"].map(ctr_map).mean()
-
-    # ---------------------------
-    # 7. Retention Intent
-    # ---------------------------
-    results["retention"] = df["How likely are you to return to this tool for future trips?"].mean()
-
-    # ---------------------------
-    # 8. NPS
-    # ---------------------------
-    nps_raw = df["How likely are you to recommend this system to a friend or colleague?"].astype(int)
-    nps_scores = nps_raw.map(map_nps_scale)
-
-    promoters = (nps_scores >= 9).sum()
-    detractors = (nps_scores <= 6).sum()
-    total = len(nps_scores)
-
-    results["nps"] = round(((promoters - detractors) / total) * 100, 2)
-
-    # ---------------------------
-    # 9. Feature Usage
-    # ---------------------------
-    feature_cols = "Which features did you use? (Select all that apply)"
-    usage_counts = {}
-
-    for row in df[feature_cols].dropna():
-        for feature in str(row).split(","):
-            feature = feature.strip()
-            if feature not in usage_counts:
-                usage_counts[feature] = 0
-            usage_counts[feature] += 1
-
-    results["feature_usage"] = usage_counts
-
-    return results
+        _memo["key"] = key
+        _memo["result"] = result
+        return dict(result)
@@ -1,40 +1,77 @@
-import json
 import os
+import copy
+import json
+import math
+import time
+import shutil
+import atexit
+import threading
 from datetime import datetime
 from collections import defaultdict
 
+import sketch_engine
+import export_engine
+from event_store_engine import open_store
+
 ANALYTICS_DIR = "analytics"
-DATA_FILE = os.path.join(ANALYTICS_DIR, "analytics_data.json")
-os.makedirs(ANALYTICS_DIR, exist_ok=True)
+
+# "json"   → analytics_data.json + append-only log (desktop build, one process)
+# "sqlite" → analytics/analytics.db in WAL mode, safe across gunicorn workers
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "json").lower()
+
+# Write path: log_* calls aggregate into an in-memory buffer that is
+# flushed as a batch of events to the store. A background compactor
+# folds new events into the stored snapshot, so ingest cost no longer
+# grows with the size of the history.
+FLUSH_INTERVAL = 1.0          # seconds between buffer flushes (max data loss on crash)
+FLUSH_SIZE = 500              # flush early once this many updates are pending
+MAX_PENDING = 20000           # hard cap on buffered updates if flushing is stuck
+COMPACT_INTERVAL = 30         # seconds between compactions
+
+# Columnar (Parquet) copy of the events + rollups for offline analysis.
+# Built on demand from the admin API, and every PARQUET_INTERVAL
+# seconds by the compactor when set (0 = on demand only).
+PARQUET_DIR = os.path.join(ANALYTICS_DIR, "parquet")
+PARQUET_INTERVAL = int(os.getenv("ANALYTICS_PARQUET_INTERVAL", "0"))
+
+# Per-user raw load-time / scroll / duration lists are only kept as a
+# bounded sample of the most recent values; totals live in "aggregates".
+KEEP_SAMPLES = os.getenv("ANALYTICS_KEEP_SAMPLES", "1") != "0"
+SAMPLE_LIMIT = 200
 
 
 # ----------------------------
 # Helpers
 # ----------------------------
-def load_analytics():
-    if not os.path.exists(DATA_FILE):
-        return {
-            "metrics": {},
-            "sus_scores": [],
-            "nps_scores": [],
-            "ctr": {},
-        }
+def empty_analytics():
+    return {
+        "metrics": {},
+        "sus_scores": [],
+        "nps_scores": [],
+        "ctr": {},
+        "aggregates": empty_aggregates(),
+    }
 
-    try:
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    except:
-        return {
-            "metrics": {},
-            "sus_scores": [],
-            "nps_scores": [],
-            "ctr": {},
-        }
 
+def empty_aggregates():
+    return {
+        "page_visits": {},
+        "click_events": {},
+        "ai_usage": {"local": 0, "online": 0},
+        "tasks": {"attempt": {}, "success": {}, "error": {}},
+        "load_times": {},       # page -> {count, sum, min, max}
+        "scroll_depth": {},     # page -> {count, sum, min, max}
+        "task_durations": {},   # task -> {count, sum, min, max}
+        "load_time_sketches": {},   # page -> quantile sketch (sketch_engine)
+        "scroll_sketches": {},      # page -> quantile sketch
+    }
 
-def save_analytics(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+
+def _prepare(data):
+    # snapshots written before aggregates existed
+    if "aggregates" not in data:
+        rebuild_aggregates(data)
+    return data
 
 
 def ensure_user(data, user):
@@ -54,74 +91,872 @@ def ensure_user(data, user):
         }
 
 
+def _bump(counter, key, amount=1):
+    counter[key] = counter.get(key, 0) + amount
+
+
+def _accumulate(table, key, values):
+    values = [v for v in values if isinstance(v, (int, float))]
+    if not values:
+        return
+
+    acc = table.get(key)
+    if acc is None:
+        acc = table[key] = {"count": 0, "sum": 0, "min": values[0], "max": values[0]}
+
+    acc["count"] += len(values)
+    acc["sum"] += sum(values)
+    acc["min"] = min(acc["min"], min(values))
+    acc["max"] = max(acc["max"], max(values))
+
+
+def _sketch(agg, table, key, values):
+    sketches = agg.setdefault(table, {})
+    if key not in sketches:
+        sketches[key] = sketch_engine.new_sketch()
+    sketch_engine.add(sketches[key], values)
+
+
+def _keep_sample(lists, key, values):
+    if not KEEP_SAMPLES:
+        return
+    samples = lists.setdefault(key, [])
+    samples.extend(values)
+    if len(samples) > SAMPLE_LIMIT:
+        del samples[:-SAMPLE_LIMIT]
+
+
+def rebuild_aggregates(data):
+    """
+    One-off migration for snapshots written before aggregates existed:
+    the raw per-user lists were complete back then, so this is exact.
+    """
+    agg = empty_aggregates()
+
+    for m in data.get("metrics", {}).values():
+        for p, c in m.get("page_visits", {}).items():
+            _bump(agg["page_visits"], p, c)
+        for e, c in m.get("click_events", {}).items():
+            _bump(agg["click_events"], e, c)
+        for src, c in m.get("ai_usage", {}).items():
+            _bump(agg["ai_usage"], src, c)
+
+        tasks = m.get("tasks", {})
+        for kind in ("attempt", "success", "error"):
+            for t, c in tasks.get(kind, {}).items():
+                _bump(agg["tasks"][kind], t, c)
+        for t, d in tasks.get("duration", {}).items():
+            _accumulate(agg["task_durations"], t, d)
+
+        for p, t in m.get("load_times", {}).items():
+            _accumulate(agg["load_times"], p, t)
+            _sketch(agg, "load_time_sketches", p, t)
+        for p, d in m.get("scroll_depth", {}).items():
+            _accumulate(agg["scroll_depth"], p, d)
+            _sketch(agg, "scroll_sketches", p, d)
+
+    data["aggregates"] = agg
+    return data
+
+
+def apply_event(data, ev):
+    """
+    Folds one logged event into the snapshot structure. Events flushed
+    from the buffer carry "n" (a pre-aggregated count) and "values"
+    (a batch of samples) instead of one line per hit.
+    """
+    kind = ev.get("type")
+    user = ev.get("user", "anonymous")
+    n = ev.get("n", 1)
+    values = ev["values"] if "values" in ev else [ev.get("value", ev.get("duration"))]
+
+    if kind in ("sus", "nps"):
+        data.setdefault(f"{kind}_scores", []).append(ev.get("score"))
+        return
+
+    if kind == "ctr":
+        ctr = data.setdefault("ctr", {})
+        ctr.setdefault(ev.get("label"), {"clicks": 0})["clicks"] += int(ev.get("clicked", 0))
+        return
+
+    if kind == "raw":
+        data.setdefault("events", []).append(ev.get("payload"))
+        return
+
+    ensure_user(data, user)
+    m = data["metrics"][user]
+    agg = data.setdefault("aggregates", empty_aggregates())
+
+    if kind == "page":
+        _bump(m["page_visits"], ev.get("page"), n)
+        _bump(agg["page_visits"], ev.get("page"), n)
+    elif kind == "click":
+        _bump(m["click_events"], ev.get("event"), n)
+        _bump(agg["click_events"], ev.get("event"), n)
+    elif kind == "load_time":
+        _keep_sample(m["load_times"], ev.get("page"), values)
+        _accumulate(agg["load_times"], ev.get("page"), values)
+        _sketch(agg, "load_time_sketches", ev.get("page"), values)
+    elif kind == "scroll":
+        _keep_sample(m["scroll_depth"], ev.get("page"), values)
+        _accumulate(agg["scroll_depth"], ev.get("page"), values)
+        _sketch(agg, "scroll_sketches", ev.get("page"), values)
+    elif kind == "ai":
+        _bump(m["ai_usage"], ev.get("source"), n)
+        _bump(agg["ai_usage"], ev.get("source"), n)
+    elif kind == "task_attempt":
+        _bump(m["tasks"]["attempt"], ev.get("task"), n)
+        _bump(agg["tasks"]["attempt"], ev.get("task"), n)
+    elif kind == "task_success":
+        _bump(m["tasks"]["success"], ev.get("task"), len(values))
+        _bump(agg["tasks"]["success"], ev.get("task"), len(values))
+        _keep_sample(m["tasks"]["duration"], ev.get("task"), values)
+        _accumulate(agg["task_durations"], ev.get("task"), values)
+    elif kind == "task_error":
+        _bump(m["tasks"]["error"], ev.get("task"), n)
+        _bump(agg["tasks"]["error"], ev.get("task"), n)
+
+    if "ts" in ev and kind in ROLLUP_KEYS:
+        _rollup(data, ev["ts"], kind, ev.get(ROLLUP_KEYS[kind]), n, values)
+
+
+# ----------------------------
+# Time-bucketed rollups
+# ----------------------------
+# Events land in minute buckets. Maintenance (run with compaction)
+# merges minute buckets older than their retention into hour buckets,
+# hours into days, and drops days past DAY_RETENTION — so each bucket
+# lives at exactly one level and totals are preserved.
+#
+# data["rollups"] = {"minute": {"<bucket start>": bucket}, "hour": ..., "day": ...}
+# bucket = {"page_visits": {page: n}, ..., "load_time": {page: sketch}}
+
+STEPS = {"minute": 60, "hour": 3600, "day": 86400}
+LEVELS = ["minute", "hour", "day"]
+RETENTION = {
+    "minute": 6 * 3600,        # then downsampled to hours
+    "hour": 14 * 86400,        # then downsampled to days
+    "day": 365 * 86400,        # then dropped
+}
+
+# event type -> rollup metric name, and the field used as its key
+ROLLUP_METRICS = {
+    "page": "page_visits",
+    "click": "click_events",
+    "ai": "ai_usage",
+    "task_attempt": "task_attempt",
+    "task_success": "task_success",
+    "task_error": "task_error",
+    "load_time": "load_time",
+}
+ROLLUP_KEYS = {
+    "page": "page",
+    "click": "event",
+    "ai": "source",
+    "task_attempt": "task",
+    "task_success": "task",
+    "task_error": "task",
+    "load_time": "page",
+}
+SKETCH_METRICS = {"load_time"}
+
+
+def _bucket_start(ts, level):
+    step = STEPS[level]
+    return int(ts // step * step)
+
+
+def _merge_bucket(into, bucket):
+    for metric, table in bucket.items():
+        target = into.setdefault(metric, {})
+        for key, v in table.items():
+            if metric in SKETCH_METRICS:
+                sketch_engine.merge(target.setdefault(key, sketch_engine.new_sketch()), v)
+            else:
+                _bump(target, key, v)
+
+
+def _rollup(data, ts, kind, key, n, values):
+    levels = data.setdefault("rollups", {})
+    minutes = levels.setdefault("minute", {})
+    bucket = minutes.setdefault(str(_bucket_start(ts, "minute")), {})
+    table = bucket.setdefault(ROLLUP_METRICS[kind], {})
+
+    if kind in SKETCH_METRICS:
+        if key not in table:
+            table[key] = sketch_engine.new_sketch()
+        sketch_engine.add(table[key], values)
+    elif kind == "task_success":
+        _bump(table, key, len(values))
+    else:
+        _bump(table, key, n)
+
+
+def downsample_rollups(data, now=None):
+    """
+    Moves expired buckets one level up (minute → hour → day) and
+    drops day buckets past retention. Returns buckets moved/dropped.
+    """
+    now = now or time.time()
+    levels = data.setdefault("rollups", {})
+    changed = 0
+
+    for i, level in enumerate(LEVELS):
+        buckets = levels.setdefault(level, {})
+        cutoff = now - RETENTION[level]
+        expired = [b for b in buckets if int(b) + STEPS[level] <= cutoff]
+
+        for b in expired:
+            bucket = buckets.pop(b)
+            changed += 1
+            if i + 1 < len(LEVELS):
+                up = LEVELS[i + 1]
+                target = levels.setdefault(up, {}).setdefault(str(_bucket_start(int(b), up)), {})
+                _merge_bucket(target, bucket)
+
+    return changed
+
+
+def parse_time(value, default):
+    if value in (None, ""):
+        return default
+    try:
+        ts = float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value)).timestamp()
+    if not math.isfinite(ts):
+        raise ValueError(f"invalid time: {value}")
+    return ts
+
+
+def _parse_step(value):
+    if value in (None, ""):
+        return STEPS["hour"]
+    if str(value) in STEPS:
+        return STEPS[str(value)]
+    step = float(value)
+    if not math.isfinite(step) or step <= 0:
+        raise ValueError(f"invalid step: {value}")
+    return max(STEPS["minute"], int(step))
+
+
+def query_timeseries(data, metric, start, end, step, key=None):
+    """
+    Points between start and end (epoch seconds), grouped by `step`
+    seconds. Only buckets inside the range are touched: per level we
+    either look up each candidate bucket start or, when the range is
+    wider than what is stored, filter the stored keys. Buckets coarser
+    than `step` are returned at their own width.
+    """
+    levels = data.get("rollups", {})
+    points = {}
+
+    for level in LEVELS:
+        width = STEPS[level]
+        buckets = levels.get(level, {})
+        if not buckets:
+            continue
+
+        first = _bucket_start(start, level)
+        if (end - first) / width <= len(buckets):
+            starts = range(first, int(end), width)
+        else:
+            starts = sorted(int(b) for b in buckets if first <= int(b) < end)
+
+        for t in starts:
+            bucket = buckets.get(str(t))
+            table = bucket.get(metric) if bucket else None
+            if table:
+                group = t // step * step if width <= step else t
+                into = points.setdefault(group, {})
+                _merge_bucket(into, {metric: {k: v for k, v in table.items() if key is None or k == key}})
+
+    series = []
+    for t in sorted(points):
+        table = points[t].get(metric, {})
+        if metric in SKETCH_METRICS:
+            value = sketch_engine.summary(sketch_engine.merged(table.values()))
+        else:
+            value = sum(table.values())
+        series.append({
+            "t": t,
+            "time": datetime.fromtimestamp(t).isoformat(timespec="minutes"),
+            "value": value,
+            "by_key": None if metric in SKETCH_METRICS else table,
+        })
+    return series
+
+
+# ----------------------------
+# Event store
+# ----------------------------
+# _state_lock guards _state: the live snapshot + events kept in
+# memory so readers never replay the store.
+store = open_store(
+    ANALYTICS_BACKEND,
+    ANALYTICS_DIR,
+    empty=empty_analytics,
+    fold=apply_event,
+    prepare=_prepare,
+    maintain=downsample_rollups,
+)
+_state_lock = threading.Lock()
+_state = None
+
+
+def write_events(events):
+    """
+    Persists a batch of events in one store write and folds them into
+    the live state. Returns True when the store wants a compaction.
+    """
+    if not events:
+        return False
+
+    # keep each event's own (valid) timestamp; stamp only the ones without
+    now = time.time()
+    events = [ev if valid_number(ev.get("ts")) else {**ev, "ts": now} for ev in events]
+
+    with _state_lock:
+        due = store.append(events)
+        # the batch is on disk now: a bad event must not fail (and so
+        # re-queue) the whole write, only its own fold
+        if _state is not None:
+            for ev in events:
+                try:
+                    apply_event(_state, ev)
+                except Exception as e:
+                    print("ANALYTICS APPLY ERROR:", e, ev)
+
+    return due
+
+
+def compact():
+    buffer.flush()
+    store.compact()
+
+
+# ----------------------------
+# In-memory aggregation buffer
+# ----------------------------
+# log_* calls only touch this buffer (a dict update under a lock).
+# Repeated hits on the same (user, page/event/...) collapse into one
+# counter; samples are batched per key. A background thread writes
+# the whole buffer to the log every FLUSH_INTERVAL seconds, or sooner
+# once FLUSH_SIZE updates are pending. Anything still buffered when
+# the process dies is lost — at most FLUSH_INTERVAL seconds of data,
+# and never more than MAX_PENDING updates (beyond that new updates
+# are dropped and counted rather than growing memory).
+
+COUNTER_FIELDS = {
+    "page": "page",
+    "click": "event",
+    "ai": "source",
+    "task_attempt": "task",
+    "task_error": "task",
+}
+SAMPLE_FIELDS = {
+    "load_time": "page",
+    "scroll": "page",
+    "task_success": "task",
+}
+
+
+class MetricsBuffer:
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, flush_size=FLUSH_SIZE, max_pending=MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._started = False
+
+        self._counts = {}    # (kind, user, key, minute) -> n
+        self._samples = {}   # (kind, user, key, minute) -> [values]
+        self._events = []    # pass-through events (sus, nps, ctr, raw)
+        self._pending = 0
+
+        self._stats = {
+            "updates": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "events_written": 0,
+            "flush_errors": 0,
+            "last_flush": 0.0,
+            "last_flush_ms": 0.0,
+        }
+
+    # ------------------------------------------------------
+    # INGEST
+    # ------------------------------------------------------
+    def _admit(self):
+        # caller holds self._lock
+        self._stats["updates"] += 1
+        if self._pending >= self.max_pending:
+            self._stats["dropped"] += 1
+            return False
+        self._pending += 1
+        if self._pending >= self.flush_size:
+            self._wake.set()
+        return True
+
+    # ts=None → stamped when flushed. A client-supplied ts (batched or
+    # delayed events) is kept to the minute so the rollups put the event
+    # in the bucket it happened in.
+    def count(self, kind, user, key, n=1, ts=None):
+        minute = None if ts is None else int(ts // 60) * 60
+        with self._lock:
+            if self._admit():
+                k = (kind, user, key, minute)
+                self._counts[k] = self._counts.get(k, 0) + n
+        self._start()
+
+    def sample(self, kind, user, key, value, ts=None):
+        minute = None if ts is None else int(ts // 60) * 60
+        with self._lock:
+            if self._admit():
+                self._samples.setdefault((kind, user, key, minute), []).append(value)
+        self._start()
+
+    def event(self, kind, user="anonymous", **fields):
+        with self._lock:
+            if self._admit():
+                self._events.append({"type": kind, "user": user, **fields})
+        self._start()
+
+    # ------------------------------------------------------
+    # FLUSH
+    # ------------------------------------------------------
+    def _drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            samples, self._samples = self._samples, {}
+            events, self._events = self._events, []
+            self._pending = 0
+
+        out = []
+        for (kind, user, key, minute), n in counts.items():
+            ev = {"type": kind, "user": user, COUNTER_FIELDS[kind]: key, "n": n}
+            if minute is not None:
+                ev["ts"] = minute
+            out.append(ev)
+        for (kind, user, key, minute), values in samples.items():
+            ev = {"type": kind, "user": user, SAMPLE_FIELDS[kind]: key, "values": values}
+            if minute is not None:
+                ev["ts"] = minute
+            out.append(ev)
+        out.extend(events)
+        return out
+
+    def flush(self):
+        """
+        Writes everything buffered so far to the event log. Safe to
+        call from any thread; concurrent flushes are serialized.
+        """
+        with self._flush_lock:
+            started = time.time()
+            events = self._drain()
+            if not events:
+                return 0
+
+            try:
+                due = write_events(events)
+            except Exception as e:
+                print("ANALYTICS FLUSH ERROR:", e)
+                with self._lock:
+                    self._stats["flush_errors"] += 1
+                    # the store append failed (write_events never raises
+                    # after it), so put the batch back for the next flush
+                    self._events = events + self._events
+                    self._pending += len(events)
+                return 0
+
+            with self._lock:
+                self._stats["flushes"] += 1
+                self._stats["events_written"] += len(events)
+                self._stats["last_flush"] = time.time()
+                self._stats["last_flush_ms"] = round((time.time() - started) * 1000, 2)
+
+        if due:
+            _compact_soon.set()
+        return len(events)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _start(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        threading.Thread(target=self._loop, name="analytics-flush", daemon=True).start()
+        threading.Thread(target=_compact_loop, name="analytics-compactor", daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["pending"] = self._pending
+            s["pending_keys"] = len(self._counts) + len(self._samples) + len(self._events)
+        s["flush_interval"] = self.flush_interval
+        s["flush_size"] = self.flush_size
+        s["max_pending"] = self.max_pending
+        return s
+
+
+_compact_soon = threading.Event()
+
+
+def _compact_loop():
+    while True:
+        _compact_soon.wait(COMPACT_INTERVAL)
+        _compact_soon.clear()
+        try:
+            compact()
+            with _state_lock:
+                if _state is not None:
+                    downsample_rollups(_state)
+
+            if PARQUET_INTERVAL and export_engine.PARQUET_AVAILABLE:
+                built = read_columnar_manifest().get("built", 0)
+                if time.time() - built >= PARQUET_INTERVAL:
+                    build_columnar_export()
+        except Exception as e:
+            print("ANALYTICS COMPACTION ERROR:", e)
+
+
+buffer = MetricsBuffer()
+atexit.register(buffer.flush)
+
+
+def buffer_stats():
+    return buffer.stats()
+
+
+# ----------------------------
+# Snapshot + tail
+# ----------------------------
+def _live_state():
+    # caller holds _state_lock; the store is read in full once per
+    # process, after that only other workers' new events are folded in
+    global _state
+    if _state is None:
+        _state = store.load()
+    else:
+        store.refresh(_state)
+    return _state
+
+
+def load_analytics():
+    """
+    Returns a private copy of the full state (for exports / admin views).
+    """
+    buffer.flush()
+    with _state_lock:
+        return copy.deepcopy(_live_state())
+
+
+def timeseries(metric, start=None, end=None, step=None, key=None):
+    """
+    Wrapper used by /api/admin/metrics/timeseries; start/end accept
+    epoch seconds or ISO strings, step "minute"/"hour"/"day" or seconds.
+    Defaults: the last 24 hours, hourly.
+    """
+    if metric not in ROLLUP_METRICS.values():
+        raise ValueError(f"unknown metric {metric!r}, expected one of {sorted(ROLLUP_METRICS.values())}")
+
+    end = parse_time(end, time.time())
+    start = parse_time(start, end - 86400)
+    step = _parse_step(step)
+
+    buffer.flush()
+    with _state_lock:
+        return query_timeseries(_live_state(), metric, start, end, step, key)
+
+
+def read_aggregates():
+    buffer.flush()
+    with _state_lock:
+        return copy.deepcopy(_live_state().get("aggregates") or empty_aggregates())
+
+
+def save_analytics(data):
+    """
+    Replaces the whole stored state (data should come from
+    load_analytics, i.e. already include every logged event).
+    """
+    global _state
+
+    buffer.flush()
+
+    with _state_lock:
+        data = copy.deepcopy(data)
+        _prepare(data)
+        store.replace(data)
+        _state = data
+
+
+def iter_analytics(split=("metrics", "rollups")):
+    """
+    Yields (key, value) pairs of the state one piece at a time — the
+    `split` sections one entry per user / rollup level ("metrics.bob")
+    — copying each piece under the lock instead of the whole state,
+    so streaming exports don't hold the lock or double memory.
+    """
+    buffer.flush()
+    with _state_lock:
+        keys = list(_live_state().keys())
+
+    for key in keys:
+        with _state_lock:
+            value = _state.get(key)
+            if key in split and isinstance(value, dict):
+                subkeys, value = list(value.keys()), None
+            else:
+                subkeys, value = None, copy.deepcopy(value)
+
+        if subkeys is None:
+            yield key, value
+            continue
+
+        for sub in subkeys:
+            with _state_lock:
+                part = copy.deepcopy(_state.get(key, {}).get(sub))
+            yield f"{key}.{sub}", part
+
+
+def iter_events(start=None, end=None, kind=None, user=None, page=None, event=None):
+    """
+    Raw logged events, oldest first. With the SQLite backend the
+    filters run on the (user, page, ts) / (event, ts) / (type, ts) indexes.
+    """
+    buffer.flush()
+    return store.iter_events(start=start, end=end, kind=kind, user=user, page=page, event=event)
+
+
+def store_stats():
+    return store.stats()
+
+
+# ----------------------------
+# Columnar export
+# ----------------------------
+_columnar_lock = threading.Lock()
+
+
+def _manifest_path():
+    return os.path.join(PARQUET_DIR, "_manifest.json")
+
+
+def read_columnar_manifest():
+    try:
+        with open(_manifest_path(), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _rollup_summary(sketch):
+    s = sketch_engine.summary(sketch)
+    return {"count": s["count"], "p50": s["p50"], "p90": s["p90"], "p99": s["p99"]}
+
+
+def build_columnar_export(full=False):
+    """
+    Writes events (partitioned by date and type) and rollups (by level)
+    as Parquet under PARQUET_DIR. Incremental by default: only the days
+    from the last exported event, less the late-arrival window, onward
+    are rewritten. Raises RuntimeError when pyarrow isn't installed.
+    """
+    if not export_engine.PARQUET_AVAILABLE:
+        raise RuntimeError("pyarrow is not installed")
+
+    with _columnar_lock:
+        manifest = {} if full else read_columnar_manifest()
+        if full:
+            shutil.rmtree(os.path.join(PARQUET_DIR, "events"), ignore_errors=True)
+
+        # events can arrive up to MAX_EVENT_AGE late (client timestamps),
+        # so every day such an event could still land in is rewritten
+        late = MAX_EVENT_AGE + MAX_CLOCK_SKEW
+        since = None
+        if manifest.get("last_ts"):
+            since = (manifest["last_ts"] - late) // 86400 * 86400   # start of that UTC day
+
+        started = time.time()
+        written, last_ts = export_engine.write_event_partitions(iter_events(start=since), PARQUET_DIR, lateness=late)
+
+        with _state_lock:
+            rollups = copy.deepcopy(_live_state().get("rollups", {}))
+        written.update(export_engine.write_rollup_partitions(rollups, PARQUET_DIR, _rollup_summary))
+
+        partitions = manifest.get("partitions", {})
+        partitions.update(written)
+        manifest = {
+            "built": time.time(),
+            "build_seconds": round(time.time() - started, 3),
+            "last_ts": last_ts or manifest.get("last_ts"),
+            "rewritten": sorted(written),
+            "partitions": partitions,
+        }
+
+        tmp = _manifest_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, _manifest_path())
+
+        return manifest
+
+
 # ----------------------------
 # Logging functions
 # ----------------------------
-def log_page(user, page):
-    data = load_analytics()
-    ensure_user(data, user)
-    data["metrics"][user]["page_visits"][page] += 1
-    save_analytics(data)
+def log_page(user, page, ts=None):
+    buffer.count("page", user, page, ts=ts)
 
 
-def log_click(user, event):
-    data = load_analytics()
-    ensure_user(data, user)
-    data["metrics"][user]["click_events"][event] += 1
-    save_analytics(data)
+def log_click(user, event, ts=None):
+    buffer.count("click", user, event, ts=ts)
 
 
-def log_load_time(user, page, t):
-    data = load_analytics()
-    ensure_user(data, user)
+def log_load_time(user, page, t, ts=None):
+    buffer.sample("load_time", user, page, t, ts=ts)
 
-    # Ensure nested dict exists
-    if page not in data["metrics"][user]["load_times"]:
-        data["metrics"][user]["load_times"][page] = []
 
-    data["metrics"][user]["load_times"][page].append(t)
-    save_analytics(data)
+def log_scroll(user, page, depth, ts=None):
+    buffer.sample("scroll", user, page, depth, ts=ts)
 
 
+def log_ai(user, source, ts=None):
+    buffer.count("ai", user, source, ts=ts)
 
-def log_scroll(user, page, depth):
-    data = load_analytics()
-    ensure_user(data, user)
 
-    if page not in data["metrics"][user]["scroll_depth"]:
-        data["metrics"][user]["scroll_depth"][page] = []
+def log_task_attempt(user, task, ts=None):
+    buffer.count("task_attempt", user, task, ts=ts)
 
-    data["metrics"][user]["scroll_depth"][page].append(depth)
-    save_analytics(data)
 
+def log_task_success(user, task, dur, ts=None):
+    buffer.sample("task_success", user, task, dur, ts=ts)
 
-def log_ai(user, source):
-    data = load_analytics()
-    ensure_user(data, user)
-    data["metrics"][user]["ai_usage"][source] += 1
-    save_analytics(data)
 
+def log_task_error(user, task, ts=None):
+    buffer.count("task_error", user, task, ts=ts)
 
-def log_task_attempt(user, task):
-    data = load_analytics()
-    ensure_user(data, user)
-    data["metrics"][user]["tasks"]["attempt"][task] += 1
-    save_analytics(data)
 
+def log_ctr(label, clicked, ts=None):
+    if ts is None:
+        buffer.event("ctr", label=label, clicked=int(clicked))
+    else:
+        buffer.event("ctr", label=label, clicked=int(clicked), ts=ts)
 
-def log_task_success(user, task, dur):
-    data = load_analytics()
-    ensure_user(data, user)
-    data["metrics"][user]["tasks"]["success"][task] += 1
-    data["metrics"][user]["tasks"]["duration"][task].append(dur)
-    save_analytics(data)
 
+def log_raw_event(payload):
+    buffer.event("raw", payload=payload)
 
-def log_task_error(user, task):
-    data = load_analytics()
-    ensure_user(data, user)
-    data["metrics"][user]["tasks"]["error"][task] += 1
-    save_analytics(data)
+
+# ----------------------------
+# Batch ingestion
+# ----------------------------
+MAX_BATCH = 500
+MAX_KEY_LENGTH = 200
+
+# accepted range for a client-supplied event "ts" (epoch seconds)
+MAX_EVENT_AGE = 24 * 3600
+MAX_CLOCK_SKEW = 300
+
+# type -> (logger, key field, value field or None)
+BATCH_TYPES = {
+    "page": (log_page, "page", None),
+    "load_time": (log_load_time, "page", "value"),
+    "scroll": (log_scroll, "page", "value"),
+    "click": (log_click, "event", None),
+    "ai": (log_ai, "source", None),
+    "task_attempt": (log_task_attempt, "task", None),
+    "task_success": (log_task_success, "task", "value"),
+    "task_error": (log_task_error, "task", None),
+}
+
+
+def _valid_key(v):
+    return isinstance(v, str) and 0 < len(v) <= MAX_KEY_LENGTH
+
+
+def valid_number(v):
+    return isinstance(v, (int, float)) and not isinstance(v, bool) and v == v and abs(v) != float("inf")
+
+
+def _valid_ts(v, now):
+    return valid_number(v) and now - MAX_EVENT_AGE <= v <= now + MAX_CLOCK_SKEW
+
+
+def ingest_batch(events, user="anonymous"):
+    """
+    Validates a list of typed events, e.g.
+        {"type": "page", "page": "/explore"}
+        {"type": "load_time", "page": "/explore", "value": 412}
+        {"type": "ctr", "label": "view_stay", "clicked": 1}
+    and logs the valid ones. An event may carry its own "user" and
+    "ts" (epoch seconds, when it happened); without ts it is stamped
+    on arrival.
+    Returns (accepted, rejected) where rejected lists {index, error}.
+    """
+    accepted = 0
+    rejected = []
+    now = time.time()
+
+    for i, ev in enumerate(events):
+        if not isinstance(ev, dict):
+            rejected.append({"index": i, "error": "not an object"})
+            continue
+
+        kind = ev.get("type")
+        who = ev.get("user") or user
+        if not _valid_key(who):
+            rejected.append({"index": i, "error": "bad user"})
+            continue
+
+        ts = ev.get("ts")
+        if ts is not None and not _valid_ts(ts, now):
+            rejected.append({"index": i, "error": "bad ts"})
+            continue
+
+        if kind == "ctr":
+            if not _valid_key(ev.get("label")) or not valid_number(ev.get("clicked", 0)):
+                rejected.append({"index": i, "error": "bad ctr event"})
+                continue
+            log_ctr(ev["label"], ev.get("clicked", 0), ts=ts)
+            accepted += 1
+            continue
+
+        if kind not in BATCH_TYPES:
+            rejected.append({"index": i, "error": f"unknown type {kind!r}"})
+            continue
+
+        log, key_field, value_field = BATCH_TYPES[kind]
+        key = ev.get(key_field)
+        if not _valid_key(key):
+            rejected.append({"index": i, "error": f"missing {key_field}"})
+            continue
+
+        if value_field is None:
+            log(who, key, ts=ts)
+        else:
+            value = ev.get(value_field, 0)
+            if not valid_number(value):
+                rejected.append({"index": i, "error": f"bad {value_field}"})
+                continue
+            log(who, key, value, ts=ts)
+
+        accepted += 1
+
+    return accepted, rejected
 
 
 # ----------------------------
@@ -136,16 +971,12 @@ def calculate_sus(answers):
 
 def submit_sus(user, answers):
     score = calculate_sus(answers)
-    data = load_analytics()
-    data["sus_scores"].append(score)
-    save_analytics(data)
+    buffer.event("sus", user, score=score)
     return score
 
 
 def submit_nps(user, score):
-    data = load_analytics()
-    data["nps_scores"].append(score)
-    save_analytics(data)
+    buffer.event("nps", user, score=score)
 
 
 # ----------------------------
@@ -166,52 +997,57 @@ def compute_uer(u):
 # ----------------------------
 # Final Metric Calculation
 # ----------------------------
+def _means(table):
+    return {k: acc["sum"] / acc["count"] for k, acc in table.items() if acc["count"]}
 
-import re
-import json
-from collections import defaultdict
 
-def compute_metrics():
-    data = load_analytics()
+def _distributions(sketches):
+    return {k: sketch_engine.summary(sk) for k, sk in sketches.items()}
 
-    total_visits = defaultdict(int)
-    total_clicks = defaultdict(int)
-    ai = {"local": 0, "online": 0}
-    load_avg = {}
-    scroll_avg = {}
 
-    for u, m in data["metrics"].items():
+# Shown until a Google Form response sheet is available
+UX_DEFAULTS = {
+    "sus": 83.3,
+    "nps": 60.8,
+    "tsr": 93.47,
+    "uer": 27.53,
+    "engagement": 4.43,
+    "ctr": 0.88,
+    "retention": 4.34,
+    "difficulty": 3.91
+}
 
-        for p, c in m["page_visits"].items():
-            total_visits[p] += c
 
-        for e, c in m["click_events"].items():
-            total_clicks[e] += c
+def ux_metrics():
+    """
+    UX survey metrics from the Google Form sheets (cached by
+    analytics/google_form_metrics.py, so this is a stat() per file
+    unless a sheet changed).
+    """
+    try:
+        from analytics.google_form_metrics import compute_google_form_metrics
+        form = compute_google_form_metrics()
+    except Exception as e:
+        print("UX FORM METRICS ERROR:", e)
+        form = {}
+
+    return {k: form.get(k, v) for k, v in UX_DEFAULTS.items()}
 
-        for src, cnt in m["ai_usage"].items():
-            ai[src] += cnt
 
-        for p, t in m["load_times"].items():
-            if t:
-                load_avg[p] = sum(t) / len(t)
+def compute_metrics():
+    agg = read_aggregates()
 
-        for p, d in m["scroll_depth"].items():
-            if d:
-                scroll_avg[p] = sum(d) / len(d)
+    ai = {"local": 0, "online": 0}
+    ai.update(agg["ai_usage"])
 
+    total_visits = agg["page_visits"]
+    total_clicks = agg["click_events"]
+    load_avg = _means(agg["load_times"])
+    scroll_avg = _means(agg["scroll_depth"])
+    load_dist = _distributions(agg.get("load_time_sketches", {}))
+    scroll_dist = _distributions(agg.get("scroll_sketches", {}))
 
-    # --------------- HARD-CODED UX METRICS FROM GOOGLE FORM --------------------
-    UX = {
-        "sus": 83.3,
-        "nps": 60.8,
-        "tsr": 93.47,
-        "uer": 27.53,
-        "engagement": 4.43,
-        "ctr": 0.88,
-        "retention": 4.34,
-        "difficulty": 3.91
-    }
-    # ---------------------------------------------------------------------------
+    UX = ux_metrics()
 
     return {
         "page_visits": dict(total_visits),
@@ -220,6 +1056,10 @@ def compute_metrics():
         "page_load_times": load_avg,
         "scroll_depth": scroll_avg,
 
+        # {page: {count, mean, min, max, p50, p90, p99}}
+        "page_load_distribution": load_dist,
+        "scroll_depth_distribution": scroll_dist,
+
         # FLATTENED UX METRICS (admin.html expects these directly)
         "sus": UX["sus"],
         "nps": UX["nps"],
@@ -4,18 +4,28 @@ import json
 import time
 import os
 import csv
-from flask import Response
+import threading
+from flask import Response, stream_with_context
 from geopy.distance import geodesic
-from flask import send_from_directory
+from flask import send_from_directory, send_file
 
 from ai_engine import (
     ask_ai,
+    ask_ai_many,
+    ask_ai_stream,
     itinerary_prompt,
     packing_prompt,
     culture_prompt,
     safety_prompt,
     experiences_prompt,
-    journal_prompt
+    journal_prompt,
+    invalidate_cache,
+    cache_stats,
+    inflight_stats,
+    router_stats,
+    queue_stats,
+    preload_local_model,
+    local_model_stats
 )
 
 from memory_engine import (
@@ -49,7 +59,21 @@ from analytics_engine import (
     log_click,
     log_task_attempt,
     log_task_success,
+    valid_number,
     log_task_error,
+    log_ctr,
+    log_raw_event,
+    buffer_stats,
+    store_stats,
+    iter_events,
+    iter_analytics,
+    parse_time,
+    build_columnar_export,
+    read_columnar_manifest,
+    PARQUET_DIR,
+    timeseries,
+    ingest_batch,
+    MAX_BATCH,
     submit_sus,
     submit_nps,
     compute_metrics,
@@ -59,6 +83,14 @@ from analytics_engine import (
 
 )
 
+import http_engine
+import export_engine
+from catalog_engine import catalog
+import store_engine
+from journal_store_engine import journal, PAGE_SIZE
+from blob_engine import blobs, NotAnImage, BlobTooLarge
+from journal_search_engine import search_index, parse_day
+from queue_engine import Overloaded
 from location_engine import get_user_location
 from weather_engine import get_weather
 
@@ -69,6 +101,23 @@ app = Flask(
     template_folder="templates"
 )
 
+# Warm the local model in the background so the first offline
+# request doesn't pay the model load.
+threading.Thread(target=preload_local_model, daemon=True).start()
+
+
+def backfill_journal_search():
+    try:
+        search_index.backfill(journal)
+    except Exception as e:
+        print("SEARCH BACKFILL ERROR:", e)
+
+
+# deleted entries leave the search index right away; on start the index
+# is reconciled with the journal (first run, failed add, crash)
+journal.on_delete = search_index.remove
+threading.Thread(target=backfill_journal_search, name="journal-search-backfill", daemon=True).start()
+
 # -------------------------------------------------------
 # DEBUG HELPER (renamed to avoid conflict)
 # -------------------------------------------------------
@@ -84,24 +133,90 @@ def ok():
 # JSON HELPERS
 # -------------------------------------------------------
 def load_json(name):
-    path1 = os.path.join("data", name)
-    if os.path.exists(path1):
-        with open(path1, "r", encoding="utf-8") as f:
-            return json.load(f)
+    """
+    Shared read-only view from the data catalog (data/ then static/data/).
+    Copy before mutating: list(...), dict(...) or catalog_engine.thaw(...).
+    """
+    return catalog.get(name, {})
 
-    path2 = os.path.join("static", "data", name)
-    if os.path.exists(path2):
-        with open(path2, "r", encoding="utf-8") as f:
-            return json.load(f)
 
-    return {}
+def save_json(name, data):
+    store_engine.write(os.path.join("data", name), data, indent=None)
 
 
-def save_json(name, data):
-    path = os.path.join("data", name)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w") as f:
-        json.dump(data, f)
+# any committed document (ours or memory_engine's) drops its catalog copy
+store_engine.store.on_write = lambda path: catalog.invalidate(os.path.basename(path))
+
+
+# -------------------------------------------------------
+# LATENCY BUDGETS
+# -------------------------------------------------------
+# Per-route AI budget in seconds: the total deadline, and — for the
+# latency-critical safety routes only — how long to wait on the primary
+# backend before hedging onto the next one. Other routes fall through
+# to the next backend only when one fails. Past the deadline the route
+# answers from cache or a fallback.
+ROUTE_BUDGETS = {
+    "itinerary": {"deadline": 45},
+    "packing": {"deadline": 30},
+    "culture": {"deadline": 30},
+    "experiences": {"deadline": 30},
+    "safety_check": {"deadline": 12, "hedge_after": 3},
+    "safety_enhanced": {"deadline": 10, "hedge_after": 2},
+    "safety_emergency": {"deadline": 8, "hedge_after": 1.5},
+    "destination": {"deadline": 20},
+    "cost": {"deadline": 30},
+    "distance": {"deadline": 10},
+    "similar": {"deadline": 15},
+}
+
+
+# Local model queue is full / too slow for the route's budget
+# and there was no cached answer to serve instead.
+@app.errorhandler(Overloaded)
+def ai_overloaded(e):
+    resp = jsonify({"status": "busy", "error": str(e), "retry_after": e.retry_after})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+
+# -------------------------------------------------------
+# SERVER-SENT EVENTS
+# -------------------------------------------------------
+def sse_response(chunks):
+    """
+    Wraps a text generator as an SSE stream:
+      data: {"token": "..."}   per chunk
+      event: done              when the generator is exhausted
+    """
+    def events():
+        for chunk in chunks:
+            yield f"data: {json.dumps({'token': chunk})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def download_response(chunks, filename, mimetype):
+    """
+    Streams an export as a chunked download. ?gzip=1 compresses it on
+    the fly and appends .gz to the filename.
+    """
+    gzip = request.args.get("gzip") in ("1", "true", "yes")
+    if gzip:
+        filename += ".gz"
+        mimetype = "application/gzip"
+
+    return Response(
+        stream_with_context(export_engine.encode(chunks, gzip=gzip)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
 
 # -------------------------------------------------------
@@ -184,10 +299,24 @@ def itinerary():
         req["interests"]
     )
 
-    response = ask_ai(prompt)
+    response = ask_ai(prompt, template="itinerary", **ROUTE_BUDGETS["itinerary"])
     return jsonify({"itinerary": response})
 
 
+@app.route("/api/itinerary/stream", methods=["POST"])
+def itinerary_stream():
+    req = request.json
+
+    prompt = itinerary_prompt(
+        req["destination"],
+        req["days"],
+        req["traveler_type"],
+        req["interests"]
+    )
+
+    return sse_response(ask_ai_stream(prompt, template="itinerary"))
+
+
 # -------------------------------------------------------
 # PACKING
 # -------------------------------------------------------
@@ -203,10 +332,25 @@ def packing_ai():
         req["traveler_type"]
     )
 
-    response = ask_ai(prompt)
+    response = ask_ai(prompt, template="packing", **ROUTE_BUDGETS["packing"])
     return jsonify({"packing_list": response})
 
 
+@app.route("/api/packing/stream", methods=["POST"])
+def packing_stream():
+    req = request.json
+
+    prompt = packing_prompt(
+        req["destination"],
+        req["climate"],
+        req["duration"],
+        req["activities"],
+        req["traveler_type"]
+    )
+
+    return sse_response(ask_ai_stream(prompt, template="packing"))
+
+
 # -------------------------------------------------------
 # CULTURAL STORYTELLING
 # -------------------------------------------------------
@@ -214,10 +358,17 @@ def packing_ai():
 def culture_ai():
     req = request.json
     prompt = culture_prompt(req["destination"])
-    response = ask_ai(prompt)
+    response = ask_ai(prompt, template="culture", **ROUTE_BUDGETS["culture"])
     return jsonify({"story": response})
 
 
+@app.route("/api/culture/stream", methods=["POST"])
+def culture_stream():
+    req = request.json
+    prompt = culture_prompt(req["destination"])
+    return sse_response(ask_ai_stream(prompt, template="culture"))
+
+
 # -------------------------------------------------------
 # SAFETY
 # -------------------------------------------------------
@@ -225,7 +376,7 @@ def culture_ai():
 def safety_check():
     req = request.json
     prompt = safety_prompt(req["location"])
-    response = ask_ai(prompt)
+    response = ask_ai(prompt, template="safety", **ROUTE_BUDGETS["safety_check"])
     return jsonify({"safety": response})
 
 
@@ -237,7 +388,7 @@ def enhanced_safety():
     gender = req["gender"]
     traveler_type = req["traveler_type"]
 
-    data = safety_engine(location, gender, traveler_type)
+    data = safety_engine(location, gender, traveler_type, **ROUTE_BUDGETS["safety_enhanced"])
     return jsonify(data)
 
 
@@ -247,7 +398,7 @@ def emergency_help():
     situation = req["situation"]
     location = req["location"]
 
-    response = ai_emergency_help(situation, location)
+    response = ai_emergency_help(situation, location, **ROUTE_BUDGETS["safety_emergency"])
     return jsonify({"advice": response})
 
 
@@ -267,17 +418,24 @@ def region_safety():
 def ai_experiences():
     req = request.json
     prompt = experiences_prompt(req["destination"], req["traveler_type"])
-    response = ask_ai(prompt)
+    response = ask_ai(prompt, template="experiences", **ROUTE_BUDGETS["experiences"])
     return jsonify({"experiences": response})
 
 
 # -------------------------------------------------------
 # JOURNAL
 # -------------------------------------------------------
+def journal_page_args():
+    cursor = request.args.get("cursor", type=int)
+    limit = request.args.get("limit", PAGE_SIZE, type=int)
+    return cursor, limit
+
+
 @app.route("/journal")
 def journal_page():
-    entries = load_json("journal.json")
-    return render_template("journal.html", entries=entries)
+    cursor, limit = journal_page_args()
+    entries, next_cursor = journal.page(cursor, limit)
+    return render_template("journal.html", entries=entries, next_cursor=next_cursor, limit=limit)
 
 
 @app.route("/journal/new")
@@ -289,26 +447,128 @@ def journal_new_page():
 def journal_save():
     data = request.json
 
-    all_entries = load_json("journal.json")
-    new_id = len(all_entries) + 1
+    entry = {"text": data["text"], "date": data["date"]}
+
+    # uploaded / inline images live in the blob store; the entry keeps the hash
+    image = data.get("image") or ""
+    image_hash = data.get("image_hash")
+    if not isinstance(image, str) or not (image_hash is None or isinstance(image_hash, str)):
+        return jsonify({"status": "error", "error": "image / image_hash must be strings"}), 400
+
+    if image.startswith("data:image/"):
+        try:
+            image_hash = blobs.put_data_url(image)["hash"]
+        except ValueError as e:
+            return jsonify({"status": "error", "error": str(e)}), 400
+        image = ""
+
+    if image_hash:
+        if not blobs.exists(image_hash):
+            return jsonify({"status": "error", "error": "unknown image"}), 400
+        entry["image_blob"] = image_hash
+    else:
+        entry["image"] = image
+
+    entry = journal.append(entry)
+    try:
+        search_index.add(entry)
+    except Exception as e:
+        # the entry is saved; the next startup backfill indexes it
+        print("SEARCH INDEX ERROR:", e)
 
-    entry = {
-        "id": new_id,
-        "text": data["text"],
-        "date": data["date"],
-        "image": data.get("image", "")
-    }
+    return jsonify({"status": "ok", "id": entry["id"]})
 
-    all_entries.append(entry)
-    save_json("journal.json", all_entries)
 
-    return jsonify({"status": "ok"})
+@app.route("/api/journal/search")
+def journal_search():
+    """
+    /api/journal/search?q=beach sunset&from=2025-11-01&to=2025-11-30&limit=20
+    Dates are inclusive; dd/mm/yyyy is accepted too.
+    """
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"status": "error", "error": "q is required"}), 400
+
+    start = request.args.get("from")
+    end = request.args.get("to")
+    start_day = parse_day(start) if start else None
+    end_day = parse_day(end) if end else None
+    if (start and not start_day) or (end and not end_day):
+        return jsonify({"status": "error", "error": "from / to must be dates (YYYY-MM-DD)"}), 400
+
+    started = time.time()
+    results, total = search_index.search(
+        query, journal, start_day, end_day, request.args.get("limit", 20, type=int)
+    )
+
+    return jsonify({
+        "query": query,
+        "total": total,
+        "results": results,
+        "took_ms": round((time.time() - started) * 1000, 2),
+    })
+
+
+@app.post("/api/journal/image")
+def journal_image_upload():
+    """
+    Raw image bytes in the body (fetch(url, {body: file})), read in
+    chunks as they arrive. Returns the hash to pass to /journal/save.
+    """
+    try:
+        if request.files.get("image"):
+            stored = blobs.put_file(request.files["image"].stream)
+        else:
+            stored = blobs.put_file(request.stream)
+    except BlobTooLarge as e:
+        return jsonify({"status": "error", "error": str(e)}), 413
+    except NotAnImage as e:
+        return jsonify({"status": "error", "error": str(e)}), 415
+
+    stored["url"] = f"/blobs/{stored['hash']}"
+    stored["thumb"] = f"/blobs/{stored['hash']}/thumb"
+    return jsonify({"status": "ok", **stored})
+
+
+BLOB_CACHE = "public, max-age=31536000, immutable"
+
+
+def blob_response(path, digest, mimetype, cache_control):
+    resp = send_file(path, mimetype=mimetype, etag=digest, conditional=True)
+    resp.headers["Cache-Control"] = cache_control
+    return resp
+
+
+@app.get("/blobs/<digest>")
+def blob_file(digest):
+    if not blobs.exists(digest):
+        return jsonify({"status": "error", "error": "not found"}), 404
+    return blob_response(blobs.path(digest), digest, blobs.mimetype(digest), BLOB_CACHE)
+
+
+@app.get("/blobs/<digest>/thumb")
+def blob_thumb(digest):
+    if not blobs.exists(digest):
+        return jsonify({"status": "error", "error": "not found"}), 404
+
+    if blobs.has_thumbnail(digest):
+        return blob_response(blobs.thumb_path(digest), digest + "-thumb", "image/jpeg", BLOB_CACHE)
+
+    # not built yet (or no Pillow): serve the original, but don't let it stick
+    blobs.schedule_thumbnail(digest)
+    return blob_response(blobs.path(digest), digest, blobs.mimetype(digest), "public, max-age=60")
 
 
 @app.route("/api/journal/all")
 def get_journals():
-    entries = load_json("journal.json")
-    return jsonify(entries)
+    """
+    Newest first, one page at a time:
+    /api/journal/all?limit=20 → {"entries": [...], "next_cursor": 81}
+    /api/journal/all?cursor=81 → the page after that (next_cursor null at the end)
+    """
+    cursor, limit = journal_page_args()
+    entries, next_cursor = journal.page(cursor, limit)
+    return jsonify({"entries": entries, "next_cursor": next_cursor})
 
 
 # -------------------------------------------------------
@@ -353,41 +613,199 @@ def admin_get_journeys():
 def export_users_csv():
     profile = load_json("user_profile.json")
 
-    output = Response()
-    output.headers["Content-Disposition"] = "attachment; filename=users.csv"
-    output.headers["Content-Type"] = "text/csv"
-
-    writer = csv.writer(output)
-    writer.writerow(profile.keys())
-    writer.writerow(profile.values())
-
-    return output
+    rows = export_engine.csv_rows([profile.values()], header=profile.keys())
+    return download_response(rows, "users.csv", "text/csv")
 
 
 @app.route("/api/admin/export/metrics_csv")
 def admin_export_metrics_csv():
-    data = {**load_analytics(), **compute_metrics()}
-
-    output = Response()
-    output.headers["Content-Disposition"] = "attachment; filename=metrics.csv"
-    output.headers["Content-Type"] = "text/csv"
-
-    writer = csv.writer(output)
-    for key, val in data.items():
-        writer.writerow([key, val])
+    def rows():
+        # one row per user / rollup level instead of one giant cell
+        for key, val in iter_analytics():
+            yield [key, val]
+        for key, val in compute_metrics().items():
+            yield [key, val]
 
-    return output
+    return download_response(export_engine.csv_rows(rows()), "metrics.csv", "text/csv")
 
 
 @app.route("/api/admin/export/json")
 def admin_export_json():
-    dump = {
-        "profile": load_json("user_profile.json"),
-        "journeys": load_json("past_journeys.json"),
-        "analytics": load_analytics(),
-        "computed": compute_metrics()
-    }
-    return jsonify(dump)
+    def parts():
+        journeys = load_json("past_journeys.json")
+        yield "profile", load_json("user_profile.json")
+        yield "journeys", iter(journeys) if isinstance(journeys, list) else journeys
+        # streamed one user / rollup level at a time
+        yield "analytics", export_engine.Raw(export_engine.json_object(iter_analytics()))
+        yield "computed", compute_metrics()
+
+    return download_response(export_engine.json_object(parts()), "triptide_export.json", "application/json")
+
+
+@app.route("/api/admin/export/events.ndjson")
+def admin_export_events():
+    """
+    Raw analytics events, one JSON object per line, oldest first.
+    Filters: from / to (epoch seconds or ISO), type, user, page, event.
+    """
+    args = request.args
+    try:
+        start = parse_time(args.get("from"), None)
+        end = parse_time(args.get("to"), None)
+    except ValueError as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
+
+    events = iter_events(
+        start=start,
+        end=end,
+        kind=args.get("type") or None,
+        user=args.get("user") or None,
+        page=args.get("page") or None,
+        event=args.get("event") or None,
+    )
+    return download_response(export_engine.ndjson_lines(events), "events.ndjson", "application/x-ndjson")
+
+
+@app.get("/api/admin/export/parquet")
+def admin_parquet_manifest():
+    if not export_engine.PARQUET_AVAILABLE:
+        return jsonify({"status": "error", "error": "Parquet export needs pyarrow (pip install pyarrow)"}), 501
+    return jsonify(read_columnar_manifest())
+
+
+@app.post("/api/admin/export/parquet")
+def admin_parquet_build():
+    if not export_engine.PARQUET_AVAILABLE:
+        return jsonify({"status": "error", "error": "Parquet export needs pyarrow (pip install pyarrow)"}), 501
+
+    full = (request.get_json(silent=True) or {}).get("full", False)
+    return jsonify(build_columnar_export(full=bool(full)))
+
+
+@app.get("/api/admin/export/parquet/<path:name>")
+def admin_parquet_file(name):
+    # e.g. events/date=2026-10-18/type=page/part-0.parquet
+    if not name.endswith(".parquet"):
+        return jsonify({"status": "error", "error": "not a parquet file"}), 404
+    return send_from_directory(os.path.abspath(PARQUET_DIR), name, as_attachment=True)
+
+
+# -------------------------------------------------------
+# AI RESPONSE CACHE
+# -------------------------------------------------------
+@app.route("/api/admin/ai/cache")
+def admin_ai_cache():
+    return jsonify(cache_stats())
+
+
+@app.route("/api/admin/ai/inflight")
+def admin_ai_inflight():
+    return jsonify(inflight_stats())
+
+
+@app.route("/api/admin/ai/router")
+def admin_ai_router():
+    return jsonify(router_stats())
+
+
+@app.route("/api/admin/ai/queue")
+def admin_ai_queue():
+    return jsonify(queue_stats())
+
+
+@app.route("/api/admin/ai/local")
+def admin_ai_local():
+    return jsonify(local_model_stats())
+
+
+@app.route("/api/admin/metrics/timeseries")
+def admin_metrics_timeseries():
+    args = request.args
+    try:
+        series = timeseries(
+            args.get("metric", "page_visits"),
+            start=args.get("from"),
+            end=args.get("to"),
+            step=args.get("step"),
+            key=args.get("key") or None
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
+
+    return jsonify({"metric": args.get("metric", "page_visits"), "points": series})
+
+
+@app.route("/api/admin/catalog")
+def admin_catalog():
+    return jsonify(catalog.stats())
+
+
+@app.route("/api/admin/store")
+def admin_store():
+    return jsonify(store_engine.store.stats())
+
+
+@app.route("/api/admin/journal")
+def admin_journal():
+    return jsonify(journal.stats())
+
+
+@app.route("/api/admin/blobs")
+def admin_blobs():
+    return jsonify(blobs.stats())
+
+
+@app.route("/api/admin/journal/search")
+def admin_journal_search():
+    return jsonify(search_index.stats())
+
+
+@app.route("/api/admin/metrics/buffer")
+def admin_metrics_buffer():
+    return jsonify(buffer_stats())
+
+
+@app.route("/api/admin/metrics/store")
+def admin_metrics_store():
+    return jsonify(store_stats())
+
+
+@app.route("/api/admin/metrics/events")
+def admin_metrics_events():
+    args = request.args
+    try:
+        limit = max(1, min(int(args.get("limit", 100)), 1000))
+        start = parse_time(args.get("from"), None)
+        end = parse_time(args.get("to"), None)
+    except ValueError as e:
+        return jsonify({"status": "error", "error": str(e)}), 400
+
+    events = []
+    for ev in iter_events(
+        start=start,
+        end=end,
+        kind=args.get("type") or None,
+        user=args.get("user") or None,
+        page=args.get("page") or None,
+        event=args.get("event") or None,
+    ):
+        events.append(ev)
+        if len(events) >= limit:
+            break
+
+    return jsonify({"count": len(events), "events": events})
+
+
+@app.post("/api/admin/ai/cache/invalidate")
+def admin_ai_cache_invalidate():
+    d = request.json or {}
+    removed = invalidate_cache(prompt=d.get("prompt"), template=d.get("template"))
+    return jsonify({"status": "ok", "removed": removed})
+
+
+@app.route("/api/admin/http")
+def admin_http_pool():
+    return jsonify(http_engine.stats())
 
 
 # -------------------------------------------------------
@@ -402,6 +820,8 @@ def m_page():
 @app.post("/api/metrics/log_load_time")
 def m_load():
     d = request.json or {}
+    if not valid_number(d.get("load_time")):
+        return jsonify({"status": "error", "error": "load_time must be a finite number"}), 400
     log_load_time(d.get("user", "anonymous"), d.get("page"), d.get("load_time"))
     return {"status": "ok"}
 
@@ -420,6 +840,9 @@ def m_scroll():
     if depth is None:
         depth = 0
 
+    if not valid_number(depth):
+        return jsonify({"status": "error", "error": "depth must be a finite number"}), 400
+
     try:
         log_scroll(user, page, depth)
         return jsonify({"status": "ok"})
@@ -449,6 +872,8 @@ def m_attempt():
 @app.post("/api/metrics/task_success")
 def m_success():
     d = request.json or {}
+    if not valid_number(d.get("duration", 0)):
+        return jsonify({"status": "error", "error": "duration must be a finite number"}), 400
     log_task_success(d.get("user", "anonymous"), d.get("task"), d.get("duration", 0))
     return {"status": "ok"}
 
@@ -459,23 +884,31 @@ def m_error():
     return {"status": "ok"}
 
 
+@app.post("/api/metrics/batch")
+def m_batch():
+    # sendBeacon posts a Blob, so don't insist on the JSON content type
+    d = request.get_json(force=True, silent=True)
+
+    if isinstance(d, list):
+        d = {"events": d}
+    if not isinstance(d, dict) or not isinstance(d.get("events"), list):
+        return jsonify({"status": "error", "error": "expected {user, events: [...]}"}), 400
+
+    events = d["events"]
+    if len(events) > MAX_BATCH:
+        return jsonify({"status": "error", "error": f"batch larger than {MAX_BATCH} events"}), 413
+
+    accepted, rejected = ingest_batch(events, d.get("user") or "anonymous")
+    return jsonify({"status": "ok", "accepted": accepted, "rejected": rejected})
+
+
 # -------------------------------------------------------
 # FIXED CTR LOGGING
 # -------------------------------------------------------
 @app.post("/api/metrics/log_ctr")
 def api_log_ctr():
     payload = request.json or {}
-    label = payload.get("label")
-    clicked = payload.get("clicked", 0)
-
-    data = load_analytics()
-    ctr = data.setdefault("ctr", {})
-
-    if label not in ctr:
-        ctr[label] = {"clicks": 0}
-
-    ctr[label]["clicks"] += int(clicked)
-    save_analytics(data)
+    log_ctr(payload.get("label"), payload.get("clicked", 0))
 
     return jsonify({"status": "ok"})
 
@@ -510,9 +943,7 @@ def survey_submit():
 @app.route("/api/event", methods=["POST"])
 def api_event_simple():
     payload = request.get_json() or {}
-    data = load_analytics()
-    data.setdefault("events", []).append(payload)
-    save_analytics(data)
+    log_raw_event(payload)
     return ok()
 
 @app.route("/api/sus", methods=["POST"])
@@ -576,9 +1007,11 @@ def destination_page(name):
     weather = {"temperature": "N/A"}
 
     safety_info = get_local_safety(place["name"])
-    story = ask_ai(f"Give a cultural overview of {place['name']} for a traveler.")
-    packing = ask_ai(f"What should someone pack when traveling to {place['name']}?")
-    experiences = ask_ai(f"What are unique experiences in {place['name']}?")
+    story, packing, experiences = ask_ai_many([
+        (f"Give a cultural overview of {place['name']} for a traveler.", "culture"),
+        (f"What should someone pack when traveling to {place['name']}?", "packing"),
+        (f"What are unique experiences in {place['name']}?", "experiences"),
+    ], **ROUTE_BUDGETS["destination"])
 
     return render_template(
         "destination.html",
@@ -626,7 +1059,7 @@ def cost_estimator():
     Return only INR values.
     """
 
-    cost = ask_ai(prompt)
+    cost = ask_ai(prompt, template="cost", **ROUTE_BUDGETS["cost"])
     return jsonify({"cost": cost})
 
 
@@ -636,7 +1069,11 @@ def distance_api():
     user_loc = get_user_location()
 
     place = req["place"]
-    coords = ask_ai(f"Give latitude and longitude of {place} as 'lat, lon'")
+    coords = ask_ai(
+        f"Give latitude and longitude of {place} as 'lat, lon'",
+        template="distance",
+        **ROUTE_BUDGETS["distance"]
+    )
 
     try:
         lat, lon = [float(x.strip()) for x in coords.split(",")]
@@ -656,6 +1093,7 @@ def book_page(destination, stay_name):
     stay = next((s for s in all_stays if s["name"] == stay_name), None)
 
     if stay:
+        stay = dict(stay)
         stay["location"] = destination
         stay["destination"] = destination
 
@@ -674,7 +1112,7 @@ def similar_stays():
         f"{[s['name'] for s in stays]}. Return only names."
     )
 
-    ai_list = ask_ai(prompt).split("\n")
+    ai_list = ask_ai(prompt, template="similar", **ROUTE_BUDGETS["similar"]).split("\n")
     ai_list = [name.strip() for name in ai_list if name.strip()]
 
     final = [s for s in stays if s["name"] in ai_list]
@@ -682,8 +1120,7 @@ def similar_stays():
     if len(final) < 3:
         final = stays[:3]
 
-    for s in final:
-        s["location"] = dest
+    final = [dict(s, location=dest) for s in final]
 
     return jsonify({"stays": final})
 
@@ -719,8 +1156,8 @@ from analytics.google_form_metrics import compute_google_form_metrics
 
 @app.route("/api/ux/formdata", methods=["GET"])
 def load_google_form_metrics():
-    path = "triptide/data/google_form.xlsx"
-    metrics = compute_google_form_metrics(path)
+    # every data/google_form*.xlsx sheet, parsed once and cached
+    metrics = compute_google_form_metrics()
     return metrics
 
 # -------------------------------------------------------
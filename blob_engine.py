@@ -0,0 +1,250 @@
+import os
+import re
+import base64
+import hashlib
+import threading
+
+from queue_engine import PriorityWorkQueue, Overloaded
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+
+# ==========================================================
+# CONTENT-ADDRESSED BLOB STORE (JOURNAL IMAGES)
+# ==========================================================
+# data/blobs/ab/ab12…ef        original bytes, named by their sha256
+# data/blobs/thumbs/ab/ab12…ef.jpg   resized copy (THUMB_SIZE box)
+#
+# Uploads are streamed to a temp file in CHUNK_SIZE pieces while being
+# hashed, so memory stays flat whatever the image size. When the hash
+# already exists the temp file is dropped (dedupe); otherwise it is
+# fsynced and renamed into place. A blob never changes once written, so
+# it can be served with a year-long immutable cache header.
+#
+# Thumbnails are made by a background worker (Pillow is optional —
+# without it the original is served in their place).
+
+BLOB_DIR = os.path.join("data", "blobs")
+CHUNK_SIZE = 64 * 1024
+MAX_BLOB_BYTES = 16 * 1024 * 1024
+THUMB_SIZE = (640, 640)
+THUMB_QUALITY = 80
+
+THUMBNAILS_AVAILABLE = Image is not None
+
+HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# magic bytes → mimetype; anything else is refused
+IMAGE_TYPES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+class BlobTooLarge(ValueError):
+    pass
+
+
+class NotAnImage(ValueError):
+    pass
+
+
+def sniff(head):
+    for magic, mimetype in IMAGE_TYPES:
+        if head.startswith(magic):
+            return mimetype
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def is_hash(value):
+    return isinstance(value, str) and bool(HASH_RE.match(value))
+
+
+class BlobStore:
+
+    def __init__(self, folder=BLOB_DIR, max_bytes=MAX_BLOB_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.tmp_dir = os.path.join(folder, "tmp")
+        self.thumb_dir = os.path.join(folder, "thumbs")
+
+        self._thumbs = PriorityWorkQueue("thumbnails", workers=1, max_depth=256, expected_service=0.3)
+        self._pending = set()
+        self._failed = set()     # digests Pillow couldn't thumbnail — not retried
+        self._lock = threading.Lock()
+        self._stats = {"stored": 0, "deduped": 0, "rejected": 0, "bytes_in": 0,
+                       "thumbs_made": 0, "thumb_errors": 0, "thumbs_shed": 0}
+
+    # ------------------------------------------------------
+    # PATHS
+    # ------------------------------------------------------
+    def path(self, digest):
+        return os.path.join(self.folder, digest[:2], digest)
+
+    def thumb_path(self, digest):
+        return os.path.join(self.thumb_dir, digest[:2], digest + ".jpg")
+
+    def exists(self, digest):
+        return is_hash(digest) and os.path.exists(self.path(digest))
+
+    def mimetype(self, digest):
+        with open(self.path(digest), "rb") as f:
+            return sniff(f.read(16)) or "application/octet-stream"
+
+    # ------------------------------------------------------
+    # WRITE
+    # ------------------------------------------------------
+    def put_stream(self, chunks):
+        """
+        Stores an iterable of byte chunks. Returns
+        {"hash", "size", "type", "deduped"}; raises NotAnImage /
+        BlobTooLarge (nothing is kept in either case).
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        tmp = os.path.join(self.tmp_dir, f"{os.getpid()}.{threading.get_ident()}.part")
+
+        h = hashlib.sha256()
+        size = 0
+        head = b""
+
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise BlobTooLarge(f"image is larger than {self.max_bytes // (1024 * 1024)} MB")
+                    h.update(chunk)
+                    f.write(chunk)
+
+                mimetype = sniff(head)
+                if mimetype is None:
+                    raise NotAnImage("only JPEG, PNG, GIF and WebP images are accepted")
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            digest = h.hexdigest()
+            final = self.path(digest)
+            deduped = os.path.exists(final)
+
+            if deduped:
+                os.remove(tmp)
+            else:
+                os.makedirs(os.path.dirname(final), exist_ok=True)
+                os.replace(tmp, final)
+
+        except ValueError:
+            with self._lock:
+                self._stats["rejected"] += 1
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        with self._lock:
+            self._stats["deduped" if deduped else "stored"] += 1
+            self._stats["bytes_in"] += size
+
+        self.schedule_thumbnail(digest)
+        return {"hash": digest, "size": size, "type": mimetype, "deduped": deduped}
+
+    def put_file(self, stream, chunk_size=CHUNK_SIZE):
+        """Stores a file-like object (e.g. request.stream) chunk by chunk."""
+        return self.put_stream(iter(lambda: stream.read(chunk_size), b""))
+
+    def put_data_url(self, url):
+        """data:image/...;base64,... → stored blob (old inline journal images)."""
+        header, _, payload = url.partition(",")
+        if not header.startswith("data:image/") or ";base64" not in header:
+            raise NotAnImage("not a base64 image data URL")
+        try:
+            raw = base64.b64decode(payload, validate=False)
+        except ValueError:
+            raise NotAnImage("invalid base64 image data")
+        return self.put_stream(raw[i:i + CHUNK_SIZE] for i in range(0, len(raw), CHUNK_SIZE))
+
+    # ------------------------------------------------------
+    # THUMBNAILS
+    # ------------------------------------------------------
+    def has_thumbnail(self, digest):
+        return os.path.exists(self.thumb_path(digest))
+
+    def schedule_thumbnail(self, digest):
+        """
+        Queues a thumbnail build; False when Pillow is missing, the queue
+        is full or this image already failed to thumbnail.
+        """
+        if not THUMBNAILS_AVAILABLE or self.has_thumbnail(digest):
+            return False
+
+        with self._lock:
+            if digest in self._failed:
+                return False
+            if digest in self._pending:
+                return True
+            self._pending.add(digest)
+
+        try:
+            self._thumbs.submit(lambda: self._make_thumbnail(digest), priority=1)
+        except Overloaded:
+            with self._lock:
+                self._pending.discard(digest)
+                self._stats["thumbs_shed"] += 1
+            return False
+        return True
+
+    def _make_thumbnail(self, digest):
+        target = self.thumb_path(digest)
+        tmp = target + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with Image.open(self.path(digest)) as img:
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail(THUMB_SIZE)
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                img.save(tmp, "JPEG", quality=THUMB_QUALITY, optimize=True)
+            os.replace(tmp, target)
+            with self._lock:
+                self._stats["thumbs_made"] += 1
+        except Exception as e:
+            print("THUMBNAIL ERROR:", digest, e)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            with self._lock:
+                self._stats["thumb_errors"] += 1
+                # blobs never change, so a failed build would fail again
+                self._failed.add(digest)
+        finally:
+            with self._lock:
+                self._pending.discard(digest)
+
+    # ------------------------------------------------------
+    # STATS
+    # ------------------------------------------------------
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["thumbs_pending"] = len(self._pending)
+            s["thumbs_failed"] = len(self._failed)
+        s["thumbnails_available"] = THUMBNAILS_AVAILABLE
+        s["thumb_queue"] = self._thumbs.stats()
+        return s
+
+
+blobs = BlobStore()
@@ -0,0 +1,352 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+# ==========================================================
+# KEY HELPERS
+# ==========================================================
+
+def normalize_prompt(prompt):
+    """
+    Collapses whitespace so prompts that only differ in
+    indentation / blank lines share one cache entry.
+    """
+    return " ".join(str(prompt).split())
+
+
+def make_key(*parts):
+    raw = "\x1f".join(str(p) for p in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ==========================================================
+# TWO-TIER CACHE (MEMORY LRU + SQLITE ON DISK)
+# ==========================================================
+
+class ResponseCache:
+    """
+    Memory tier : OrderedDict LRU, bounded by entry count
+    Disk tier   : SQLite table, bounded by row count (least recently used go first)
+
+    Entries carry an absolute expiry time and an optional tag
+    (the prompt template) so whole templates can be invalidated.
+    """
+
+    def __init__(self, path, max_memory=256, max_disk=5000):
+        self.path = path
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+
+        self._memory = OrderedDict()  # key -> (value, expires_at, tag)
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._db = None
+        self._disk_rows = 0
+
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "stale_hits": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "invalidations": 0,
+        }
+
+        self._open_disk()
+
+    # ------------------------------------------------------
+    # DISK TIER SETUP
+    # ------------------------------------------------------
+    def _open_disk(self):
+        if not self.path:
+            return
+
+        try:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+
+            db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    tag TEXT,
+                    value TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    expires REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_entries_tag ON entries(tag)")
+            db.commit()
+
+            self._disk_rows = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            self._db = db
+
+        except Exception as e:
+            # Read-only installs (e.g. packaged desktop build) → memory only
+            print("AI CACHE DISK TIER DISABLED:", e)
+            self._db = None
+
+    # ------------------------------------------------------
+    # MEMORY TIER
+    # ------------------------------------------------------
+    def _remember(self, key, value, expires, tag):
+        with self._lock:
+            self._memory[key] = (value, expires, tag)
+            self._memory.move_to_end(key)
+
+            while len(self._memory) > self.max_memory:
+                self._memory.popitem(last=False)
+                self._stats["memory_evictions"] += 1
+
+    # ------------------------------------------------------
+    # PUBLIC API
+    # ------------------------------------------------------
+    def get(self, key, allow_stale=False):
+        """
+        allow_stale=True also returns expired entries (still on disk
+        until evicted) — used as a last resort when a deadline is blown.
+        """
+        now = time.time()
+
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                value, expires, tag = item
+                if expires > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+
+                if allow_stale:
+                    self._stats["stale_hits"] += 1
+                    return value
+
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+        if self._db is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        with self._disk_lock:
+            row = self._db.execute(
+                "SELECT value, expires, tag FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and row[1] > now:
+                self._db.execute(
+                    "UPDATE entries SET accessed = ? WHERE key = ?", (now, key)
+                )
+                self._db.commit()
+
+        if row is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        value, expires, tag = row
+        if expires <= now:
+            if allow_stale:
+                with self._lock:
+                    self._stats["stale_hits"] += 1
+                return value
+
+            with self._lock:
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+            return None
+
+        self._remember(key, value, expires, tag)
+        with self._lock:
+            self._stats["disk_hits"] += 1
+        return value
+
+    def set(self, key, value, ttl, tag=""):
+        if not ttl or ttl <= 0:
+            return
+
+        now = time.time()
+        expires = now + ttl
+        self._remember(key, value, expires, tag)
+
+        with self._lock:
+            self._stats["stores"] += 1
+
+        if self._db is None:
+            return
+
+        with self._disk_lock:
+            existed = self._db.execute(
+                "SELECT 1 FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, tag, value, created, expires, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, tag, value, now, expires, now)
+            )
+            if not existed:
+                self._disk_rows += 1
+
+            overflow = self._disk_rows - self.max_disk
+            if overflow > 0:
+                self._db.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY accessed ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self._disk_rows -= overflow
+                with self._lock:
+                    self._stats["disk_evictions"] += overflow
+
+            self._db.commit()
+
+    def invalidate(self, key=None, tag=None):
+        """
+        invalidate(key=...)  → drop one entry
+        invalidate(tag=...)  → drop every entry of a template
+        invalidate()         → drop everything
+        Returns the number of disk rows removed (memory entries are always dropped).
+        """
+        with self._lock:
+            if key is None and tag is None:
+                self._memory.clear()
+            else:
+                doomed = [
+                    k for k, (_, _, t) in self._memory.items()
+                    if (key is not None and k == key) or (tag is not None and t == tag)
+                ]
+                for k in doomed:
+                    del self._memory[k]
+            self._stats["invalidations"] += 1
+
+        if self._db is None:
+            return 0
+
+        with self._disk_lock:
+            if key is not None:
+                cur = self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            elif tag is not None:
+                cur = self._db.execute("DELETE FROM entries WHERE tag = ?", (tag,))
+            else:
+                cur = self._db.execute("DELETE FROM entries")
+            self._db.commit()
+            removed = cur.rowcount
+            self._disk_rows = max(0, self._disk_rows - removed)
+
+        return removed
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["memory_entries"] = len(self._memory)
+
+        lookups = s["memory_hits"] + s["disk_hits"] + s["misses"]
+        s["disk_entries"] = self._disk_rows if self._db is not None else 0
+        s["disk_enabled"] = self._db is not None
+        s["hit_ratio"] = round((s["memory_hits"] + s["disk_hits"]) / lookups, 4) if lookups else 0
+        return s
+
+
+# ==========================================================
+# SINGLE-FLIGHT (COALESCE IDENTICAL IN-FLIGHT CALLS)
+# ==========================================================
+
+class FlightCancelled(Exception):
+    """
+    Raised by a leader's fn when it gave up on purpose (e.g. lost a
+    hedge race). The leader's caller sees it; waiters run their own fn.
+    """
+    pass
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    do(key, fn): the first caller for a key runs fn(); callers that
+    arrive while it is running wait for that run and get the same
+    result (or exception) instead of starting their own. If the
+    run ends in FlightCancelled, the waiters start over instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {
+            "leaders": 0,
+            "waiters": 0,
+            "max_waiters": 0,
+            "retried": 0,
+        }
+
+    def do(self, key, fn):
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                return self._lead(key, call, fn)
+
+            call.event.wait()
+            if isinstance(call.error, FlightCancelled):
+                with self._lock:
+                    self._stats["retried"] += 1
+                continue   # the leader walked away — don't inherit that
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+    def _join(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["leaders"] += 1
+            else:
+                call.waiters += 1
+                self._stats["waiters"] += 1
+            return call, leader
+
+    def _lead(self, key, call, fn):
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self._stats["max_waiters"] = max(self._stats["max_waiters"], call.waiters)
+            call.event.set()
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["in_flight"] = len(self._calls)
+            s["waiting_now"] = sum(c.waiters for c in self._calls.values())
+
+        total = s["leaders"] + s["waiters"]
+        s["coalesce_ratio"] = round(s["waiters"] / total, 4) if total else 0
+        return s
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import threading
+
+
+# ==========================================================
+# DATA CATALOG (SHARED, HOT-RELOADED JSON DOCUMENTS)
+# ==========================================================
+# Every engine and route reads its JSON data (destinations, stays,
+# safety, weather defaults, ...) through one catalog. Each document is
+# parsed once and kept in memory; a get() re-stats the file (at most
+# every CHECK_INTERVAL seconds) and reloads it when its mtime, size or
+# inode changed — so edits show up without restarting the process.
+#
+# Documents are handed out as read-only views shared by every caller.
+# Mutating one raises TypeError; take a copy first (dict(x), list(x),
+# copy.deepcopy(x) or thaw(x)).
+
+SEARCH_PATHS = ["data", os.path.join("static", "data")]
+CHECK_INTERVAL = 1.0
+
+
+class ReadOnlyError(TypeError):
+    pass
+
+
+def _readonly(self, *args, **kwargs):
+    raise ReadOnlyError("catalog data is shared and read-only — copy it before changing it")
+
+
+class FrozenDict(dict):
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (dict, (thaw(self),))
+
+
+class FrozenList(list):
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = remove = pop = clear = sort = reverse = _readonly
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (list, (thaw(self),))
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Plain, mutable deep copy of a catalog value."""
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [thaw(v) for v in value]
+    return value
+
+
+class _Entry:
+    __slots__ = ("path", "signature", "value", "checked")
+
+    def __init__(self, path, signature, value):
+        self.path = path
+        self.signature = signature
+        self.value = value
+        self.checked = time.time()
+
+
+class Catalog:
+
+    def __init__(self, search_paths=SEARCH_PATHS, check_interval=CHECK_INTERVAL):
+        self.search_paths = list(search_paths)
+        self.check_interval = check_interval
+
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "loads": 0, "reloads": 0, "missing": 0, "errors": 0}
+
+    # ------------------------------------------------------
+    # FILES
+    # ------------------------------------------------------
+    def _find(self, name):
+        if os.path.isabs(name) or os.path.dirname(name):
+            return name if os.path.exists(name) else None
+        for folder in self.search_paths:
+            path = os.path.join(folder, name)
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def _signature(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _load(self, name, path):
+        signature = self._signature(path)
+        with open(path, "r", encoding="utf-8") as f:
+            value = freeze(json.load(f))
+        return _Entry(path, signature, value)
+
+    # ------------------------------------------------------
+    # PUBLIC API
+    # ------------------------------------------------------
+    def get(self, name, default=None):
+        """
+        Read-only view of data/<name> (falling back to static/data/<name>),
+        or `default` if the file doesn't exist / doesn't parse.
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and now - entry.checked < self.check_interval:
+                self._stats["hits"] += 1
+                return entry.value
+
+        path = self._find(name)
+        if path is None:
+            with self._lock:
+                self._entries.pop(name, None)
+                self._stats["missing"] += 1
+            return default
+
+        try:
+            if entry is not None and entry.path == path and entry.signature == self._signature(path):
+                with self._lock:
+                    entry.checked = now
+                    self._stats["hits"] += 1
+                return entry.value
+
+            fresh = self._load(name, path)
+        except (OSError, ValueError) as e:
+            # half-written file: keep serving the last good copy
+            print("CATALOG LOAD ERROR:", name, e)
+            with self._lock:
+                self._stats["errors"] += 1
+            return entry.value if entry is not None else default
+
+        with self._lock:
+            self._stats["reloads" if entry is not None else "loads"] += 1
+            self._entries[name] = fresh
+        return fresh.value
+
+    def invalidate(self, name=None):
+        """Forget one document (or all) — the next get() re-reads it."""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["documents"] = {name: e.path for name, e in self._entries.items()}
+        s["check_interval"] = self.check_interval
+        return s
+
+
+catalog = Catalog()
+
+
+def load(name, default=None):
+    return catalog.get(name, default)
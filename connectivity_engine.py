@@ -0,0 +1,145 @@
+import time
+import socket
+import threading
+
+
+# ==========================================================
+# SHARED CONNECTIVITY MONITOR
+# ==========================================================
+# One background thread probes the network; every engine reads
+# the cached answer through is_online() instead of opening its
+# own socket per request.
+
+PROBE_HOST = ("1.1.1.1", 80)
+PROBE_TIMEOUT = 1
+
+ONLINE_INTERVAL = 15      # seconds between probes while online
+MIN_BACKOFF = 2           # first retry delay once we go offline
+MAX_BACKOFF = 60          # retry delay ceiling while offline
+
+_online = None            # None until the first probe has finished
+_last_probe = 0.0
+_last_change = 0.0
+_failures = 0
+
+_first_probe = threading.Event()
+_wake = threading.Event()
+_start_lock = threading.Lock()
+_listeners = []
+_thread = None
+
+
+def probe():
+    try:
+        conn = socket.create_connection(PROBE_HOST, timeout=PROBE_TIMEOUT)
+        conn.close()
+        return True
+    except OSError:
+        return False
+
+
+# ----------------------------------------------------------
+# STATE CHANGE EVENTS
+# ----------------------------------------------------------
+
+def subscribe(callback):
+    """
+    callback(online: bool) runs on the monitor thread
+    every time the state flips.
+    """
+    _listeners.append(callback)
+    return callback
+
+
+def unsubscribe(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+
+def _set_state(online):
+    global _online, _last_probe, _last_change, _failures
+
+    _last_probe = time.time()
+    _failures = 0 if online else _failures + 1
+
+    changed = online != _online
+    _online = online
+    _first_probe.set()
+
+    if not changed:
+        return
+
+    _last_change = _last_probe
+    for callback in list(_listeners):
+        try:
+            callback(online)
+        except Exception as e:
+            print("CONNECTIVITY LISTENER ERROR:", e)
+
+
+# ----------------------------------------------------------
+# MONITOR THREAD
+# ----------------------------------------------------------
+
+def _run():
+    backoff = MIN_BACKOFF
+
+    while True:
+        online = probe()
+        _set_state(online)
+
+        if online:
+            delay = ONLINE_INTERVAL
+            backoff = MIN_BACKOFF
+        else:
+            delay = backoff
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+        _wake.wait(delay)
+        _wake.clear()
+
+
+def start():
+    global _thread
+
+    with _start_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="connectivity-monitor", daemon=True)
+            _thread.start()
+
+
+def report_failure():
+    """
+    Engines call this when an upstream request fails at the
+    network level so the monitor re-probes right away instead
+    of waiting for the next scheduled check.
+    """
+    start()
+    _wake.set()
+
+
+# ----------------------------------------------------------
+# PUBLIC READ API
+# ----------------------------------------------------------
+
+def is_online():
+    """
+    Cached state — a plain module-global read, no socket and no lock.
+    Only the very first call waits (at most one probe timeout).
+    """
+    state = _online
+    if state is None:
+        start()
+        _first_probe.wait(PROBE_TIMEOUT + 0.5)
+        state = _online
+    return bool(state)
+
+
+def status():
+    return {
+        "online": bool(_online),
+        "known": _online is not None,
+        "last_probe": _last_probe,
+        "last_change": _last_change,
+        "consecutive_failures": _failures,
+    }
@@ -0,0 +1,521 @@
+import os
+import json
+import glob
+import time
+import uuid
+import sqlite3
+import threading
+
+
+# ==========================================================
+# ANALYTICS EVENT STORES
+# ==========================================================
+# Where analytics events and the folded snapshot live. Both stores
+# expose the same methods and know nothing about the snapshot's shape;
+# analytics_engine passes in how to build / fold / maintain it:
+#
+#   load()                    → state (snapshot + everything after it)
+#   append(events)            → True when a compaction is due
+#   refresh(state)            → folds events other processes wrote since
+#                               the last load/refresh, returns how many
+#   compact()                 → folds new events into the stored snapshot
+#   replace(state)            → overwrite the snapshot
+#   iter_events(start, end, kind, user, page, event)
+#   stats()
+#
+# JSON   : append-only NDJSON log + snapshot file. One process only
+#          (desktop build). Compacted segments are archived for export
+#          and pruned once past ARCHIVE_RETENTION / ARCHIVE_MAX_BYTES.
+# SQLite : WAL-mode database shared by every worker process. Rows folded
+#          into the snapshot are deleted once past ARCHIVE_RETENTION.
+
+SNAPSHOT_NAME = "analytics_data.json"
+LOG_NAME = "events.log"
+ARCHIVE_DIR = "archive"
+DB_NAME = "analytics.db"
+
+COMPACT_BYTES = 1024 * 1024   # JSON: compact early once the log gets this big
+ARCHIVE_RETENTION = 30 * 86400      # raw events kept this long (rollups keep the totals)
+ARCHIVE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _matches(ev, start, end, kind, user, page, event):
+    ts = ev.get("ts", 0)
+    if start is not None and ts < start:
+        return False
+    if end is not None and ts >= end:
+        return False
+    if kind is not None and ev.get("type") != kind:
+        return False
+    if user is not None and ev.get("user") != user:
+        return False
+    if page is not None and ev.get("page") != page:
+        return False
+    if event is not None and _event_key(ev) != event:
+        return False
+    return True
+
+
+def _event_key(ev):
+    # the non-page key of an event: click name, task, AI source or CTR label
+    for field in ("event", "task", "source", "label"):
+        if ev.get(field) is not None:
+            return ev[field]
+    return None
+
+
+# ==========================================================
+# JSON (SNAPSHOT FILE + APPEND-ONLY LOG)
+# ==========================================================
+
+class JsonEventStore:
+
+    name = "json"
+
+    def __init__(self, folder, empty, fold, prepare=None, maintain=None,
+                 archive_retention=ARCHIVE_RETENTION, archive_max_bytes=ARCHIVE_MAX_BYTES):
+        self.folder = folder
+        self.snapshot_file = os.path.join(folder, SNAPSHOT_NAME)
+        self.log_file = os.path.join(folder, LOG_NAME)
+        self.archive_dir = os.path.join(folder, ARCHIVE_DIR)
+
+        self.empty = empty
+        self.fold = fold
+        self.prepare = prepare or (lambda data: data)
+        self.maintain = maintain or (lambda data: None)
+        self.archive_retention = archive_retention
+        self.archive_max_bytes = archive_max_bytes
+
+        self._lock = threading.Lock()
+        self._fh = None
+        os.makedirs(folder, exist_ok=True)
+
+    # ------------------------------------------------------
+    # FILES
+    # ------------------------------------------------------
+    def _read_snapshot(self):
+        if not os.path.exists(self.snapshot_file):
+            return self.empty()
+
+        try:
+            with open(self.snapshot_file, "r") as f:
+                data = json.load(f)
+        except:
+            return self.empty()
+
+        return self.prepare(data)
+
+    def _write_snapshot(self, data):
+        tmp = self.snapshot_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_file)
+
+    def _segments(self):
+        # log files frozen by a compaction that has not finished (yet)
+        return sorted(glob.glob(self.log_file + ".*.compacting"))
+
+    @staticmethod
+    def _segment_id(path):
+        return os.path.basename(path).split(".")[-2]
+
+    def _archived(self):
+        return sorted(glob.glob(os.path.join(self.archive_dir, "*.ndjson")))
+
+    def _prune_archive(self):
+        """
+        Drops the oldest archived segments once they are older than the
+        retention or the archive is over its size cap. Only called after
+        the snapshot holding their totals has been written.
+        """
+        cutoff = time.time() - self.archive_retention
+        files = [(f, os.path.getsize(f)) for f in self._archived()]
+        total = sum(size for _, size in files)
+
+        for path, size in files:
+            rotated = int(os.path.basename(path).split(".")[0]) / 1e9
+            if rotated >= cutoff and total <= self.archive_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as e:
+                print("ANALYTICS ARCHIVE ERROR:", e)
+                break
+
+    @staticmethod
+    def _read_events(path):
+        if not os.path.exists(path):
+            return
+
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # torn last line after a crash
+                    continue
+
+    def _close_log(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    # ------------------------------------------------------
+    # STORE API
+    # ------------------------------------------------------
+    def load(self):
+        data = self._read_snapshot()
+        # internal marker: which segments the snapshot already holds
+        done = data.pop("_compacted", "")
+
+        for seg in self._segments():
+            if self._segment_id(seg) > done:
+                for ev in self._read_events(seg):
+                    self.fold(data, ev)
+
+        with self._lock:
+            if self._fh is not None:
+                self._fh.flush()
+        for ev in self._read_events(self.log_file):
+            self.fold(data, ev)
+
+        return data
+
+    def append(self, events):
+        lines = "".join(json.dumps(ev) + "\n" for ev in events)
+
+        with self._lock:
+            if self._fh is None:
+                self._fh = open(self.log_file, "a", encoding="utf-8")
+            self._fh.write(lines)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            return self._fh.tell() >= COMPACT_BYTES
+
+    def refresh(self, data):
+        # single writer: everything in the log was folded at append time
+        return 0
+
+    def compact(self):
+        """
+        Freezes the current log as a segment, folds it (plus any segment
+        left over from an interrupted compaction) into the snapshot, then
+        moves the folded segments to the archive. Holds the lock
+        throughout so a concurrent replace() can't be overwritten.
+        """
+        with self._lock:
+            self._close_log()
+            if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > 0:
+                seg_id = "%020d" % time.time_ns()
+                os.replace(self.log_file, f"{self.log_file}.{seg_id}.compacting")
+
+            data = self._read_snapshot()
+            done = data.get("_compacted", "")
+
+            applied = []
+            for seg in self._segments():
+                if self._segment_id(seg) > done:
+                    for ev in self._read_events(seg):
+                        self.fold(data, ev)
+                applied.append(seg)
+
+            if not applied:
+                return
+
+            self.maintain(data)
+            data["_compacted"] = self._segment_id(applied[-1])
+            self._write_snapshot(data)
+
+            os.makedirs(self.archive_dir, exist_ok=True)
+            for seg in applied:
+                os.replace(seg, os.path.join(self.archive_dir, self._segment_id(seg) + ".ndjson"))
+            self._prune_archive()
+
+    def replace(self, data):
+        with self._lock:
+            self._close_log()
+
+            data = dict(data)
+            data.pop("_compacted", None)
+            self._write_snapshot(data)
+
+            for seg in self._segments():
+                os.remove(seg)
+            if os.path.exists(self.log_file):
+                os.remove(self.log_file)
+
+    def iter_events(self, start=None, end=None, kind=None, user=None, page=None, event=None):
+        """
+        Archived segments are named after the moment they were rotated,
+        so segments rotated before `start` are skipped without reading.
+        """
+        files = self._archived()
+        if start is not None:
+            files = [f for f in files if int(os.path.basename(f).split(".")[0]) / 1e9 >= start]
+        files += self._segments() + [self.log_file]
+
+        with self._lock:
+            if self._fh is not None:
+                self._fh.flush()
+
+        for path in files:
+            for ev in self._read_events(path):
+                if _matches(ev, start, end, kind, user, page, event):
+                    yield ev
+
+    def stats(self):
+        size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+        archived = self._archived()
+        return {
+            "backend": self.name,
+            "log_bytes": size,
+            "pending_segments": len(self._segments()),
+            "archived_segments": len(archived),
+            "archive_bytes": sum(os.path.getsize(f) for f in archived),
+        }
+
+
+# ==========================================================
+# SQLITE (WAL, SHARED BY WORKER PROCESSES)
+# ==========================================================
+
+class SQLiteEventStore:
+    """
+    events   : one row per flushed event, indexed on (user, page, ts),
+               (event, ts) and (type, ts). `origin` is a per-process
+               token so refresh() can skip rows this process already
+               folded when it wrote them.
+    snapshot : single row — folded state up to `last_id`.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, folder, empty, fold, prepare=None, maintain=None, legacy=None,
+                 retention=ARCHIVE_RETENTION):
+        self.path = os.path.join(folder, DB_NAME)
+        self.empty = empty
+        self.fold = fold
+        self.prepare = prepare or (lambda data: data)
+        self.maintain = maintain or (lambda data: None)
+        self.legacy = legacy   # store to import from when the database is new
+        self.retention = retention
+
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+        self._origin = None
+        self._last_id = 0
+        self._pruned = 0
+        os.makedirs(folder, exist_ok=True)
+
+    # ------------------------------------------------------
+    # CONNECTION (re-opened after fork, e.g. gunicorn --preload)
+    # ------------------------------------------------------
+    def _conn(self):
+        if self._db is not None and self._pid == os.getpid():
+            return self._db
+
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                type TEXT NOT NULL,
+                user TEXT,
+                page TEXT,
+                event TEXT,
+                origin TEXT NOT NULL,
+                body TEXT NOT NULL
+            )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS idx_events_user_page_ts ON events(user, page, ts)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_events_event_ts ON events(event, ts)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_events_type_ts ON events(type, ts)")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS snapshot (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                last_id INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        db.commit()
+
+        self._db = db
+        self._pid = os.getpid()
+        self._origin = f"{self._pid}-{uuid.uuid4().hex[:12]}"
+        return db
+
+    def _read_snapshot(self, db):
+        row = db.execute("SELECT last_id, data FROM snapshot WHERE id = 1").fetchone()
+        if row is not None:
+            return row[0], self.prepare(json.loads(row[1]))
+
+        # new database: start from whatever the JSON store had
+        data = self.legacy.load() if self.legacy is not None else self.empty()
+        db.execute(
+            "INSERT OR IGNORE INTO snapshot (id, last_id, data, updated) VALUES (1, 0, ?, ?)",
+            (json.dumps(data), time.time())
+        )
+        db.commit()
+        return self._read_snapshot(db)
+
+    def _fold_after(self, db, data, last_id, skip_origin=None):
+        rows = db.execute(
+            "SELECT id, origin, body FROM events WHERE id > ? ORDER BY id", (last_id,)
+        )
+        folded = 0
+        for row_id, origin, body in rows:
+            last_id = row_id
+            if origin == skip_origin:
+                continue
+            self.fold(data, json.loads(body))
+            folded += 1
+        return last_id, folded
+
+    # ------------------------------------------------------
+    # STORE API
+    # ------------------------------------------------------
+    def load(self):
+        with self._lock:
+            db = self._conn()
+            last_id, data = self._read_snapshot(db)
+            self._last_id, _ = self._fold_after(db, data, last_id)
+            return data
+
+    def append(self, events):
+        with self._lock:
+            db = self._conn()
+            rows = [
+                (
+                    ev.get("ts", time.time()),
+                    ev.get("type"),
+                    ev.get("user"),
+                    ev.get("page"),
+                    _event_key(ev),
+                    self._origin,
+                    json.dumps(ev),
+                )
+                for ev in events
+            ]
+            with db:
+                db.executemany(
+                    "INSERT INTO events (ts, type, user, page, event, origin, body) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+        return False
+
+    def refresh(self, data):
+        with self._lock:
+            db = self._conn()
+            self._last_id, folded = self._fold_after(db, data, self._last_id, skip_origin=self._origin)
+            return folded
+
+    def compact(self):
+        """
+        Folds events newer than the stored snapshot into it, then drops
+        folded rows older than the retention (client timestamps are at
+        most a day old, so no worker still has them to fold). BEGIN
+        IMMEDIATE makes concurrent compactions from other workers wait.
+        Freed pages are reused, the file is not shrunk (no VACUUM).
+        """
+        with self._lock:
+            db = self._conn()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                last_id, data = self._read_snapshot_locked(db)
+                new_last, folded = self._fold_after(db, data, last_id)
+                if folded:
+                    self.maintain(data)
+                    db.execute(
+                        "UPDATE snapshot SET last_id = ?, data = ?, updated = ? WHERE id = 1",
+                        (new_last, json.dumps(data), time.time())
+                    )
+                pruned = db.execute(
+                    "DELETE FROM events WHERE id <= ? AND ts < ?",
+                    (new_last, time.time() - self.retention)
+                ).rowcount
+                db.commit()
+                self._pruned += pruned
+            except Exception:
+                db.rollback()
+                raise
+
+    def _read_snapshot_locked(self, db):
+        row = db.execute("SELECT last_id, data FROM snapshot WHERE id = 1").fetchone()
+        if row is None:
+            return 0, self.empty()
+        return row[0], self.prepare(json.loads(row[1]))
+
+    def replace(self, data):
+        data = dict(data)
+        data.pop("_compacted", None)
+
+        with self._lock:
+            db = self._conn()
+            with db:
+                last_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+                db.execute(
+                    "INSERT OR REPLACE INTO snapshot (id, last_id, data, updated) VALUES (1, ?, ?, ?)",
+                    (last_id, json.dumps(data), time.time())
+                )
+            self._last_id = last_id
+
+    def iter_events(self, start=None, end=None, kind=None, user=None, page=None, event=None):
+        where, args = [], []
+        for column, value in (("user", user), ("page", page), ("event", event), ("type", kind)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                args.append(value)
+        if start is not None:
+            where.append("ts >= ?")
+            args.append(start)
+        if end is not None:
+            where.append("ts < ?")
+            args.append(end)
+
+        sql = "SELECT body FROM events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ts, id"
+
+        # separate connection so a slow export never holds the store lock
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            for (body,) in db.execute(sql, args):
+                yield json.loads(body)
+        finally:
+            db.close()
+
+    def stats(self):
+        with self._lock:
+            db = self._conn()
+            events = db.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+            row = db.execute("SELECT last_id, updated FROM snapshot WHERE id = 1").fetchone()
+
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "events": events,
+            "snapshot_last_id": row[0] if row else 0,
+            "snapshot_updated": row[1] if row else None,
+            "process_last_id": self._last_id,
+            "pruned": self._pruned,
+            "origin": self._origin,
+        }
+
+
+def open_store(backend, folder, empty, fold, prepare=None, maintain=None):
+    json_store = JsonEventStore(folder, empty, fold, prepare, maintain)
+    if backend == "sqlite":
+        return SQLiteEventStore(folder, empty, fold, prepare, maintain, legacy=json_store)
+    return json_store
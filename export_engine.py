@@ -0,0 +1,258 @@
+import os
+import csv
+import json
+import zlib
+import datetime
+
+
+# ==========================================================
+# STREAMING EXPORTS
+# ==========================================================
+# Generators that turn rows / documents into text chunks without
+# building the whole payload, plus an optional gzip stage. app.py
+# wraps them in a streamed (chunked) Response.
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _LineBuffer:
+    """File-like target for csv.writer that hands each row back."""
+
+    def __init__(self):
+        self.value = ""
+
+    def write(self, text):
+        self.value += text
+
+    def take(self):
+        text, self.value = self.value, ""
+        return text
+
+
+def csv_rows(rows, header=None):
+    """
+    Yields one CSV-encoded line per row (any iterable of sequences).
+    """
+    buf = _LineBuffer()
+    writer = csv.writer(buf)
+
+    if header is not None:
+        writer.writerow(header)
+        yield buf.take()
+
+    for row in rows:
+        writer.writerow(row)
+        yield buf.take()
+
+
+def ndjson_lines(items):
+    for item in items:
+        yield json.dumps(item, default=str) + "\n"
+
+
+class Raw:
+    """Already-encoded JSON chunks (e.g. a nested json_object stream)."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+
+def json_object(pairs):
+    """
+    Streams {"key": value, ...}. A value that is an iterator/generator
+    is written as a JSON array one item at a time, a Raw value is
+    passed through, anything else is dumped in one go.
+    """
+    yield "{"
+    first = True
+
+    for key, value in pairs:
+        yield ("" if first else ",") + json.dumps(key) + ":"
+        first = False
+
+        if isinstance(value, Raw):
+            yield from value.chunks
+        elif hasattr(value, "__next__"):
+            yield "["
+            for i, item in enumerate(value):
+                yield ("," if i else "") + json.dumps(item, default=str)
+            yield "]"
+        else:
+            yield json.dumps(value, default=str)
+
+    yield "}"
+
+
+def coalesce(chunks, size=CHUNK_SIZE):
+    """
+    Joins many small text chunks into ~size pieces so the response
+    isn't thousands of tiny writes. Yields bytes.
+    """
+    parts, length = [], 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        parts.append(chunk)
+        length += len(chunk)
+
+        if length >= size:
+            yield b"".join(parts)
+            parts, length = [], 0
+
+    if parts:
+        yield b"".join(parts)
+
+
+def gzip_stream(chunks, level=6):
+    """
+    gzip-compresses a stream of bytes incrementally (wbits=31 writes
+    the gzip header/trailer), so memory stays constant.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+
+    yield compressor.flush()
+
+
+def encode(chunks, gzip=False):
+    stream = coalesce(chunks)
+    return gzip_stream(stream) if gzip else stream
+
+
+# ==========================================================
+# COLUMNAR (PARQUET) EXPORT
+# ==========================================================
+# Events are written as Hive-style partitions so tools like pandas,
+# DuckDB or Spark can prune by date / type without reading the rest:
+#   <root>/events/date=2026-10-18/type=page/part-0.parquet
+#   <root>/rollups/level=hour/part-0.parquet
+# Partition keys (date, type, level) live only in the path, as Hive
+# layouts expect. pyarrow is optional; without it PARQUET_AVAILABLE is
+# False and the admin endpoints answer 501.
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+PARQUET_AVAILABLE = pa is not None
+
+if PARQUET_AVAILABLE:
+    EVENT_SCHEMA = pa.schema([
+        ("ts", pa.timestamp("ms", tz="UTC")),
+        ("user", pa.string()),
+        ("page", pa.string()),
+        ("key", pa.string()),
+        ("n", pa.int64()),
+        ("values", pa.list_(pa.float64())),
+        ("extra", pa.string()),   # any other fields, as JSON
+    ])
+    ROLLUP_SCHEMA = pa.schema([
+        ("bucket", pa.timestamp("s", tz="UTC")),
+        ("metric", pa.string()),
+        ("key", pa.string()),
+        ("count", pa.int64()),
+        ("p50", pa.float64()),
+        ("p90", pa.float64()),
+        ("p99", pa.float64()),
+    ])
+
+_EVENT_FIELDS = {"ts", "user", "type", "page", "n", "values", "value", "duration",
+                 "event", "task", "source"}
+
+
+def _utc_date(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+def _event_row(ev):
+    values = ev.get("values")
+    if values is None and isinstance(ev.get("value", ev.get("duration")), (int, float)):
+        values = [ev.get("value", ev.get("duration"))]
+
+    key = ev.get("event", ev.get("task", ev.get("source", ev.get("label"))))
+    extra = {k: v for k, v in ev.items() if k not in _EVENT_FIELDS}
+
+    return {
+        "ts": datetime.datetime.fromtimestamp(ev.get("ts", 0), datetime.timezone.utc),
+        "user": ev.get("user"),
+        "page": ev.get("page"),
+        "key": None if key is None else str(key),
+        "n": int(ev.get("n", len(values) if values else 1)),
+        "values": [float(v) for v in values if isinstance(v, (int, float))] if values else None,
+        "extra": json.dumps(extra, default=str) if extra else None,
+    }
+
+
+def _write_table(rows, schema, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(pa.Table.from_pylist(rows, schema=schema), tmp, compression="snappy")
+    os.replace(tmp, path)
+
+
+def write_event_partitions(events, root, lateness=0):
+    """
+    events must be in time order give or take `lateness` seconds (the
+    SQLite store yields them sorted; the JSON log is in arrival order and
+    accepts client timestamps up to a day old). A day's partitions are
+    written once an event `lateness` past the end of that day has been
+    seen, so memory holds a day or two of rows at most.
+    Returns {partition path: row count} and the last (largest) timestamp.
+    """
+    written = {}
+    last_ts = None
+    days = {}   # day start → {type: rows}
+
+    def flush(day):
+        date = _utc_date(day)
+        for kind, kind_rows in days.pop(day).items():
+            rel = os.path.join("events", f"date={date}", f"type={kind}", "part-0.parquet")
+            _write_table(kind_rows, EVENT_SCHEMA, os.path.join(root, rel))
+            written[rel] = len(kind_rows)
+
+    for ev in events:
+        ts = ev.get("ts", 0)
+        day = int(ts // 86400 * 86400)
+        days.setdefault(day, {}).setdefault(ev.get("type") or "unknown", []).append(_event_row(ev))
+
+        if last_ts is None or ts > last_ts:
+            last_ts = ts
+            for done in [d for d in days if d + 86400 + lateness <= ts]:
+                flush(done)
+
+    for day in sorted(days):
+        flush(day)
+
+    return written, last_ts
+
+
+def write_rollup_partitions(rollups, root, summarize):
+    """
+    rollups: {"minute"|"hour"|"day": {bucket_start: {metric: {key: count|sketch}}}}
+    summarize(sketch) → {"count", "p50", "p90", "p99"} for sketch metrics.
+    """
+    written = {}
+    for level, buckets in rollups.items():
+        rows = []
+        for start, bucket in sorted(buckets.items(), key=lambda kv: int(kv[0])):
+            when = datetime.datetime.fromtimestamp(int(start), datetime.timezone.utc)
+            for metric, table in bucket.items():
+                for key, v in table.items():
+                    row = {"bucket": when, "metric": metric, "key": str(key),
+                           "count": v, "p50": None, "p90": None, "p99": None}
+                    if isinstance(v, dict):
+                        row.update(summarize(v))
+                    rows.append(row)
+
+        rel = os.path.join("rollups", f"level={level}", "part-0.parquet")
+        _write_table(rows, ROLLUP_SCHEMA, os.path.join(root, rel))
+        written[rel] = len(rows)
+
+    return written
@@ -0,0 +1,161 @@
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from connectivity_engine import report_failure
+
+
+# ==========================================================
+# SHARED OUTBOUND HTTP CLIENT
+# ==========================================================
+# One requests.Session for the whole process. urllib3 keeps a
+# separate keep-alive pool per host behind it, so repeat calls
+# to Groq / Open-Meteo / ipapi reuse the TCP+TLS connection.
+
+POOL_HOSTS = 16           # how many per-host pools to keep around
+POOL_SIZE = 10            # keep-alive connections kept per host
+
+# connect / read timeouts (seconds) and retry budget per upstream.
+# Retries only apply to idempotent methods unless the caller opts in.
+# "local" upstreams live on this machine, so failing to reach them
+# says nothing about internet connectivity.
+UPSTREAMS = {
+    "groq": {"connect": 3, "read": 25, "retries": 0},
+    "ollama": {"connect": 1, "read": 60, "retries": 0, "local": True},
+    "open-meteo": {"connect": 2, "read": 3, "retries": 2},
+    "ipapi": {"connect": 2, "read": 3, "retries": 2},
+    "gnews": {"connect": 2, "read": 4, "retries": 1},
+    "default": {"connect": 3, "read": 10, "retries": 1},
+}
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+BACKOFF_BASE = 0.2
+BACKOFF_MAX = 2.0
+
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE, max_retries=0)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _host_stats(host):
+    if host not in _stats:
+        _stats[host] = {
+            "requests": 0,
+            "retries": 0,
+            "errors": 0,
+            "in_flight": 0,
+            "total_time": 0.0,
+        }
+    return _stats[host]
+
+
+def _bump(host, **deltas):
+    with _stats_lock:
+        s = _host_stats(host)
+        for k, v in deltas.items():
+            s[k] += v
+
+
+def _backoff(attempt):
+    # "full jitter": sleep anywhere between 0 and the exponential cap
+    cap = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+# ----------------------------------------------------------
+# REQUESTS
+# ----------------------------------------------------------
+
+def request(upstream, method, url, retries=None, **kwargs):
+    """
+    Sends one request through the shared pool.
+
+    upstream : key into UPSTREAMS (timeouts + retry budget)
+    retries  : override the retry budget (pass it explicitly to
+               retry a non-idempotent call that is safe to repeat)
+
+    Raises the usual requests exceptions once retries are used up.
+    """
+    method = method.upper()
+    cfg = UPSTREAMS.get(upstream, UPSTREAMS["default"])
+    host = urlsplit(url).netloc
+
+    kwargs.setdefault("timeout", (cfg["connect"], cfg["read"]))
+
+    if retries is None:
+        retries = cfg["retries"] if method in IDEMPOTENT_METHODS else 0
+
+    attempt = 0
+    while True:
+        _bump(host, requests=1, in_flight=1)
+        started = time.time()
+
+        try:
+            resp = _session.request(method, url, **kwargs)
+
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            _bump(host, in_flight=-1, errors=1, total_time=time.time() - started)
+
+            if attempt >= retries:
+                if isinstance(e, requests.exceptions.ConnectionError) and not cfg.get("local"):
+                    report_failure()
+                raise
+
+        else:
+            _bump(host, in_flight=-1, total_time=time.time() - started)
+
+            if resp.status_code not in RETRY_STATUSES or attempt >= retries:
+                return resp
+            resp.close()
+
+        _bump(host, retries=1)
+        time.sleep(_backoff(attempt))
+        attempt += 1
+
+
+def get(upstream, url, **kwargs):
+    return request(upstream, "GET", url, **kwargs)
+
+
+def post(upstream, url, **kwargs):
+    return request(upstream, "POST", url, **kwargs)
+
+
+# ----------------------------------------------------------
+# POOL USAGE
+# ----------------------------------------------------------
+
+def stats():
+    with _stats_lock:
+        hosts = {h: dict(s) for h, s in _stats.items()}
+
+    for s in hosts.values():
+        done = s["requests"] - s["in_flight"]
+        s["avg_time"] = round(s["total_time"] / done, 4) if done else 0
+        s["total_time"] = round(s["total_time"], 4)
+
+    pools = _adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None:
+            continue
+
+        host = pool.host if pool.port in (None, 80, 443) else f"{pool.host}:{pool.port}"
+        entry = hosts.setdefault(host, {})
+        entry["connections_opened"] = entry.get("connections_opened", 0) + pool.num_connections
+        entry["pooled_requests"] = entry.get("pooled_requests", 0) + pool.num_requests
+        idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+        entry["idle_connections"] = entry.get("idle_connections", 0) + idle
+
+    return {"pool_size": POOL_SIZE, "hosts": hosts}
@@ -32,7 +32,7 @@ Provide structured JSON in this format:
 }}
 """
 
-    response = ask_ai(prompt)
+    response = ask_ai(prompt, template="journal")
 
     # Try to return parsed JSON — AI may give text, so fallback
     try:
@@ -0,0 +1,342 @@
+import os
+import re
+import html
+import math
+import time
+import sqlite3
+import datetime
+import threading
+
+
+# ==========================================================
+# JOURNAL FULL-TEXT SEARCH (SQLITE INVERTED INDEX + BM25)
+# ==========================================================
+# data/journal/search.db keeps, per stemmed term, the entries it occurs
+# in and how often (postings), plus each entry's length and day.
+# journal_save indexes the new entry right away and deletes drop it;
+# on start the index is reconciled with the journal store (entries it
+# missed are indexed, deleted ones removed). A query reads only the
+# postings of its own terms, ranks them with BM25 and then loads just
+# the top hits from the journal to build highlighted snippets — it
+# never touches the rest of the journal.
+
+INDEX_PATH = os.path.join("data", "journal", "search.db")
+
+K1 = 1.2
+B = 0.75
+MAX_RESULTS = 50
+SNIPPET_CHARS = 160
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from",
+    "had", "has", "have", "i", "in", "is", "it", "its", "me", "my", "of",
+    "on", "or", "so", "that", "the", "this", "to", "was", "we", "were",
+    "with", "our", "us", "you",
+}
+
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d.%m.%Y")
+
+
+# ----------------------------
+# Text processing
+# ----------------------------
+def stem(word):
+    """
+    Light suffix stripper (plural / -ing / -ed / -ly ...): enough for
+    "beaches" ~ "beach" and "hiking" ~ "hike" without a stemming library.
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+    for suffix, repl in (("ies", "y"), ("ing", ""), ("edly", ""), ("ed", ""),
+                         ("ly", ""), ("es", ""), ("ss", "ss"), ("s", "")):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)] + repl
+            break
+    # hiking → hik, hike → hik; running → runn → run
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Stemmed terms of text, stopwords removed, in order."""
+    terms = []
+    for match in TOKEN_RE.finditer(str(text).lower()):
+        word = match.group().strip("_")
+        if word and word not in STOPWORDS:
+            terms.append(stem(word))
+    return terms
+
+
+def parse_day(value):
+    """Journal dates ('17/11/2025', '2025-11-17', ...) → '2025-11-17' or None."""
+    value = str(value or "").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def entry_text(entry):
+    # older entries used title/content instead of text
+    return " ".join(str(entry.get(k, "")) for k in ("title", "text", "content") if entry.get(k))
+
+
+def highlight(text, stems, width=SNIPPET_CHARS):
+    """
+    HTML-escaped snippet around the first match, matched words wrapped
+    in <mark>.
+    """
+    text = str(text)
+    spans = [m.span() for m in TOKEN_RE.finditer(text) if stem(m.group().lower()) in stems]
+
+    start = 0
+    if spans and len(text) > width:
+        start = max(0, spans[0][0] - width // 4)
+    end = min(len(text), start + width)
+
+    out, pos = [], start
+    for s, e in spans:
+        if s < start or e > end:
+            continue
+        out.append(html.escape(text[pos:s]))
+        out.append("<mark>" + html.escape(text[s:e]) + "</mark>")
+        pos = e
+    out.append(html.escape(text[pos:end]))
+
+    return ("…" if start > 0 else "") + "".join(out) + ("…" if end < len(text) else "")
+
+
+# ----------------------------
+# Index
+# ----------------------------
+class JournalSearchIndex:
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+        self._stats = {"indexed": 0, "backfilled": 0, "removed": 0, "queries": 0, "query_ms": 0.0}
+
+    def _conn(self):
+        if self._db is not None:
+            return self._db
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                day TEXT,
+                length INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS docs_day ON docs (day);
+
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID;
+
+            -- corpus totals for BM25, so queries never scan docs
+            CREATE TABLE IF NOT EXISTS corpus (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                docs INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO corpus (id, docs, length)
+                SELECT 1, COUNT(*), COALESCE(SUM(length), 0) FROM docs;
+        """)
+        self._db = db
+        return db
+
+    def _add(self, db, entry):
+        doc_id = int(entry["id"])
+        if db.execute("SELECT 1 FROM docs WHERE id = ?", (doc_id,)).fetchone():
+            return False
+
+        terms = tokenize(entry_text(entry))
+        counts = {}
+        for t in terms:
+            counts[t] = counts.get(t, 0) + 1
+
+        db.execute("INSERT INTO docs (id, day, length) VALUES (?, ?, ?)",
+                   (doc_id, parse_day(entry.get("date")), len(terms)))
+        db.executemany("INSERT INTO postings (term, doc, tf) VALUES (?, ?, ?)",
+                       [(t, doc_id, n) for t, n in counts.items()])
+        db.executemany("""
+            INSERT INTO terms (term, df) VALUES (?, 1)
+            ON CONFLICT(term) DO UPDATE SET df = df + 1
+        """, [(t,) for t in counts])
+        db.execute("UPDATE corpus SET docs = docs + 1, length = length + ? WHERE id = 1", (len(terms),))
+        return True
+
+    # ------------------------------------------------------
+    # MAINTENANCE
+    # ------------------------------------------------------
+    def add(self, entry):
+        """Indexes one journal entry (no-op if its id is already indexed)."""
+        with self._lock:
+            db = self._conn()
+            with db:
+                added = self._add(db, entry)
+            if added:
+                self._stats["indexed"] += 1
+        return added
+
+    def _remove(self, db, doc_id):
+        row = db.execute("SELECT length FROM docs WHERE id = ?", (doc_id,)).fetchone()
+        if not row:
+            return False
+
+        terms = [t for (t,) in db.execute("SELECT term FROM postings WHERE doc = ?", (doc_id,))]
+        db.executemany("UPDATE terms SET df = df - 1 WHERE term = ?", [(t,) for t in terms])
+        db.execute("DELETE FROM terms WHERE df <= 0")
+        db.execute("DELETE FROM postings WHERE doc = ?", (doc_id,))
+        db.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+        db.execute("UPDATE corpus SET docs = docs - 1, length = length - ? WHERE id = 1", (row[0],))
+        return True
+
+    def remove(self, doc_id):
+        """Drops a deleted journal entry from postings, df and corpus totals."""
+        with self._lock:
+            db = self._conn()
+            with db:
+                removed = self._remove(db, int(doc_id))
+            if removed:
+                self._stats["removed"] += 1
+        return removed
+
+    def backfill(self, journal, batch=100):
+        """
+        Brings the index in line with the journal: indexes every live
+        entry that is missing (wherever it sits in the id range) and
+        drops indexed entries that no longer exist.
+        """
+        live = journal.ids()
+        with self._lock:
+            db = self._conn()
+            indexed = {i for (i,) in db.execute("SELECT id FROM docs")}
+
+        live_set = set(live)
+        missing = [i for i in live if i not in indexed]
+        stale = [i for i in indexed if i not in live_set]
+
+        added = 0
+        for n in range(0, len(missing), batch):
+            entries = [journal.get(i) for i in missing[n:n + batch]]
+            with self._lock:
+                db = self._conn()
+                with db:
+                    added += sum(1 for e in entries if e is not None and self._add(db, e))
+
+        if stale:
+            with self._lock:
+                db = self._conn()
+                with db:
+                    for i in stale:
+                        self._remove(db, i)
+
+        with self._lock:
+            self._stats["backfilled"] += added
+            self._stats["removed"] += len(stale)
+        return added
+
+    # ------------------------------------------------------
+    # QUERY
+    # ------------------------------------------------------
+    def search(self, query, journal, start=None, end=None, limit=20):
+        """
+        BM25-ranked entries for query. start / end are inclusive
+        'YYYY-MM-DD' days. Returns (results, total_matches).
+        """
+        started = time.time()
+        stems = list(dict.fromkeys(tokenize(query)))
+        limit = max(1, min(int(limit), MAX_RESULTS))
+
+        if not stems:
+            return [], 0
+
+        where, params = "", []
+        if start:
+            where += " AND d.day >= ?"
+            params.append(start)
+        if end:
+            where += " AND d.day <= ?"
+            params.append(end)
+
+        with self._lock:
+            db = self._conn()
+            n_docs, total_len = db.execute("SELECT docs, length FROM corpus").fetchone()
+            avg_len = (total_len / n_docs) if n_docs and total_len else 1.0
+
+            marks = ",".join("?" * len(stems))
+            weights = []
+            for term, df in db.execute(f"SELECT term, df FROM terms WHERE term IN ({marks})", stems):
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                weights += [term, idf]
+
+            if not weights:
+                top, total = [], 0
+            else:
+                # BM25 summed per entry inside SQLite: only the top rows come back
+                query_terms = ",".join("(?, ?)" for _ in range(len(weights) // 2))
+                scored = f"""
+                    WITH q(term, idf) AS (VALUES {query_terms})
+                    SELECT p.doc AS doc,
+                           SUM(q.idf * p.tf * {K1 + 1} /
+                               (p.tf + {K1} * (1 - {B} + {B} * d.length / ?))) AS score
+                    FROM q
+                    JOIN postings p ON p.term = q.term
+                    JOIN docs d ON d.id = p.doc
+                    WHERE 1 = 1{where}
+                    GROUP BY p.doc
+                """
+                args = weights + [avg_len] + params
+                top = db.execute(scored + " ORDER BY score DESC, doc DESC LIMIT ?", args + [limit]).fetchall()
+                total = db.execute(f"SELECT COUNT(*) FROM ({scored})", args).fetchone()[0]
+
+        stem_set = set(stems)
+        results = []
+        for doc, score in top:
+            entry = journal.get(doc)
+            if entry is None:
+                continue   # deleted since it was indexed
+            result = dict(entry)
+            result["score"] = round(score, 4)
+            result["snippet"] = highlight(entry_text(entry), stem_set)
+            results.append(result)
+
+        took = (time.time() - started) * 1000
+        with self._lock:
+            self._stats["queries"] += 1
+            self._stats["query_ms"] += took
+
+        return results, total
+
+    def stats(self):
+        with self._lock:
+            db = self._conn()
+            s = dict(self._stats)
+            s["documents"] = db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            s["terms"] = db.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+        query_ms = s.pop("query_ms")
+        s["avg_query_ms"] = round(query_ms / s["queries"], 2) if s["queries"] else 0
+        return s
+
+
+search_index = JournalSearchIndex()
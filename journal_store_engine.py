@@ -0,0 +1,253 @@
+import os
+import json
+import struct
+import bisect
+import threading
+
+
+# ==========================================================
+# JOURNAL STORE (APPEND-ONLY LOG + ID INDEX)
+# ==========================================================
+# data/journal/entries.log   one JSON record per line, never rewritten
+# data/journal/entries.idx   fixed-size (id, offset, length, flags) per record
+#
+# Saving an entry appends one line to the log and one 21-byte record to
+# the index, so it costs the same on the 10th entry as on the 10,000th.
+# IDs only ever go up (deleted IDs are not reused). On start the index is
+# read into memory (id → offset); any log tail the index missed after a
+# crash is re-indexed, a torn last line is cut off. Entries are then read
+# with one positioned read each, and pages are found by bisecting the id
+# list — a page costs `limit` reads whatever the history size.
+#
+# Like the JSON analytics store this assumes one writing process.
+
+JOURNAL_DIR = os.path.join("data", "journal")
+LOG_NAME = "entries.log"
+INDEX_NAME = "entries.idx"
+LEGACY_FILE = os.path.join("data", "journal.json")
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+_RECORD = struct.Struct("<QQIB")   # id, offset, length, flags
+_DELETED = 1
+
+
+class JournalStore:
+
+    def __init__(self, folder=JOURNAL_DIR, legacy=LEGACY_FILE, on_delete=None):
+        self.folder = folder
+        self.legacy = legacy
+        self.on_delete = on_delete   # callback(entry_id) after a delete
+        self.log_path = os.path.join(folder, LOG_NAME)
+        self.index_path = os.path.join(folder, INDEX_NAME)
+
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._ids = []          # live ids, ascending
+        self._offsets = {}      # id → (offset, length)
+        self._next_id = 1
+        self._log = None
+        self._index = None
+        self._reader = None
+        self._stats = {"appends": 0, "deletes": 0, "reads": 0, "reindexed": 0, "migrated": 0}
+
+    # ------------------------------------------------------
+    # OPEN / RECOVER
+    # ------------------------------------------------------
+    def _open(self):
+        if self._loaded:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+
+        fresh = not os.path.exists(self.log_path)
+        self._log = open(self.log_path, "ab")
+        self._index = open(self.index_path, "ab")
+        self._reader = open(self.log_path, "rb")
+
+        indexed_end = self._read_index()
+        self._recover(indexed_end)
+        self._loaded = True
+
+        if fresh and self.legacy and os.path.exists(self.legacy):
+            self._migrate()
+
+    def _read_index(self):
+        """Loads the index; returns the log offset it covers up to."""
+        with open(self.index_path, "rb") as f:
+            raw = f.read()
+
+        whole = len(raw) - len(raw) % _RECORD.size
+        if whole != len(raw):
+            # torn index record — drop it, _recover re-indexes that entry
+            self._index.truncate(whole)
+
+        end = 0
+        for entry_id, offset, length, flags in _RECORD.iter_unpack(raw[:whole]):
+            self._track(entry_id, offset, length, flags)
+            end = offset + length
+        return end
+
+    def _recover(self, indexed_end):
+        size = os.path.getsize(self.log_path)
+        if size <= indexed_end:
+            return
+
+        with open(self.log_path, "rb") as f:
+            f.seek(indexed_end)
+            tail = f.read()
+
+        offset = indexed_end
+        for line in tail.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            self._index_record(record, offset, len(line))
+            self._stats["reindexed"] += 1
+            offset += len(line)
+
+        if offset < size:
+            print("JOURNAL RECOVERY: dropping", size - offset, "bytes of torn log tail")
+            self._log.truncate(offset)
+            self._log.seek(offset)
+        self._index.flush()
+
+    def _migrate(self):
+        try:
+            with open(self.legacy, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except (OSError, ValueError) as e:
+            print("JOURNAL MIGRATION ERROR:", e)
+            return
+
+        for entry in legacy if isinstance(legacy, list) else []:
+            entry = dict(entry)
+            # old ids were len()+1 and may be missing or repeated
+            if not isinstance(entry.get("id"), int) or entry["id"] < self._next_id:
+                entry["id"] = self._next_id
+            self._write(entry)
+            self._stats["migrated"] += 1
+        self._sync()
+
+    # ------------------------------------------------------
+    # LOW LEVEL
+    # ------------------------------------------------------
+    def _track(self, entry_id, offset, length, flags):
+        if flags & _DELETED:
+            if self._offsets.pop(entry_id, None) is not None:
+                self._ids.pop(bisect.bisect_left(self._ids, entry_id))
+        else:
+            if entry_id not in self._offsets:
+                bisect.insort(self._ids, entry_id)
+            self._offsets[entry_id] = (offset, length)
+        self._next_id = max(self._next_id, entry_id + 1)
+
+    def _index_record(self, record, offset, length):
+        flags = _DELETED if record.get("deleted") else 0
+        self._index.write(_RECORD.pack(record["id"], offset, length, flags))
+        self._track(record["id"], offset, length, flags)
+
+    def _write(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        offset = self._log.tell()
+        self._log.write(line)
+        self._index_record(record, offset, len(line))
+
+    def _sync(self):
+        # log first: an index record must never point past the log
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._index.flush()
+        os.fsync(self._index.fileno())
+
+    def _read(self, entry_id):
+        offset, length = self._offsets[entry_id]
+        self._reader.seek(offset)
+        return json.loads(self._reader.read(length))
+
+    # ------------------------------------------------------
+    # PUBLIC API
+    # ------------------------------------------------------
+    def append(self, entry):
+        """Stores entry with the next id; returns the stored record."""
+        with self._lock:
+            self._open()
+            record = dict(entry)
+            record["id"] = self._next_id
+            self._write(record)
+            self._sync()
+            self._stats["appends"] += 1
+        return record
+
+    def delete(self, entry_id):
+        with self._lock:
+            self._open()
+            if entry_id not in self._offsets:
+                return False
+            self._write({"id": entry_id, "deleted": True})
+            self._sync()
+            self._stats["deletes"] += 1
+
+        if self.on_delete is not None:
+            self.on_delete(entry_id)
+        return True
+
+    def get(self, entry_id):
+        with self._lock:
+            self._open()
+            if entry_id not in self._offsets:
+                return None
+            self._stats["reads"] += 1
+            return self._read(entry_id)
+
+    def page(self, cursor=None, limit=PAGE_SIZE, newest_first=True):
+        """
+        One page of entries plus the cursor for the next one (None at the
+        end). The cursor is the last id returned, so new entries don't
+        shift pages that are already being scrolled.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        with self._lock:
+            self._open()
+            if newest_first:
+                end = len(self._ids) if cursor is None else bisect.bisect_left(self._ids, cursor)
+                ids = self._ids[max(0, end - limit):end][::-1]
+                more = end - limit > 0
+            else:
+                start = 0 if cursor is None else bisect.bisect_right(self._ids, cursor)
+                ids = self._ids[start:start + limit]
+                more = start + limit < len(self._ids)
+
+            entries = [self._read(i) for i in ids]
+            self._stats["reads"] += len(entries)
+
+        next_cursor = ids[-1] if ids and more else None
+        return entries, next_cursor
+
+    def ids(self):
+        """Live entry ids, ascending."""
+        with self._lock:
+            self._open()
+            return list(self._ids)
+
+    def count(self):
+        with self._lock:
+            self._open()
+            return len(self._ids)
+
+    def stats(self):
+        with self._lock:
+            self._open()
+            s = dict(self._stats)
+            s["entries"] = len(self._ids)
+            s["next_id"] = self._next_id
+        s["log_bytes"] = os.path.getsize(self.log_path)
+        s["index_bytes"] = os.path.getsize(self.index_path)
+        return s
+
+
+journal = JournalStore()
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import threading
+
+import requests
+
+import http_engine
+
+
+# ==========================================================
+# PERSISTENT LOCAL MODEL CLIENT (OLLAMA HTTP API)
+# ==========================================================
+# Talks to a long-running `ollama serve` instead of forking
+# `ollama run` per prompt. The model stays loaded between calls
+# (keep_alive) and the HTTP connection is reused through
+# http_engine's pool. Point OLLAMA_HOST at a stub server to test.
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# After a failed connect, skip the server for this long so every
+# call doesn't pay a connect attempt while Ollama is down.
+DOWN_RETRY_AFTER = 30
+
+
+class LocalModelError(Exception):
+    pass
+
+
+class LocalModelUnavailable(LocalModelError):
+    """Server not reachable — caller may fall back to the CLI."""
+    pass
+
+
+def _base_url(host):
+    host = host.strip().rstrip("/")
+    if "://" not in host:
+        host = "http://" + host
+    return host
+
+
+class LocalModelClient:
+
+    def __init__(self, model, host=OLLAMA_HOST, keep_alive=OLLAMA_KEEP_ALIVE):
+        self.model = model
+        self.base_url = _base_url(host)
+        self.keep_alive = keep_alive
+
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "errors": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "preloaded": False,
+        }
+
+    # ------------------------------------------------------
+    # HELPERS
+    # ------------------------------------------------------
+    def _payload(self, prompt, stream):
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }
+
+    def _post(self, body, stream=False):
+        if time.time() < self._down_until:
+            raise LocalModelUnavailable("local model server marked down")
+
+        try:
+            resp = http_engine.post("ollama", self.base_url + "/api/generate", json=body, stream=stream)
+        except requests.exceptions.ConnectionError as e:
+            self._down_until = time.time() + DOWN_RETRY_AFTER
+            raise LocalModelUnavailable(str(e))
+        except requests.exceptions.RequestException as e:
+            self._count(errors=1)
+            raise LocalModelError(str(e))
+
+        self._down_until = 0.0
+
+        if resp.status_code != 200:
+            try:
+                message = resp.json().get("error", f"HTTP {resp.status_code}")
+            except Exception:
+                message = f"HTTP {resp.status_code}"
+            resp.close()
+            self._count(errors=1)
+            raise LocalModelError(message)
+
+        return resp
+
+    def _count(self, **deltas):
+        with self._lock:
+            for k, v in deltas.items():
+                self._stats[k] += v
+
+    @staticmethod
+    def _usage(data):
+        return {
+            "prompt_tokens": data.get("prompt_eval_count", 0),
+            "completion_tokens": data.get("eval_count", 0),
+        }
+
+    # ------------------------------------------------------
+    # PUBLIC API
+    # ------------------------------------------------------
+    def generate(self, prompt):
+        """
+        Returns {"text", "prompt_tokens", "completion_tokens"}.
+        """
+        resp = self._post(self._payload(prompt, stream=False))
+        try:
+            data = resp.json()
+        finally:
+            resp.close()
+
+        usage = self._usage(data)
+        self._count(requests=1, **usage)
+
+        return {"text": data.get("response", "").strip(), **usage}
+
+    def stream(self, prompt):
+        """
+        Yields text chunks; the final token counts are added to
+        the client's stats when the stream completes.
+        """
+        resp = self._post(self._payload(prompt, stream=True), stream=True)
+        try:
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+
+                data = json.loads(line)
+                if data.get("error"):
+                    self._count(errors=1)
+                    raise LocalModelError(data["error"])
+
+                if data.get("response"):
+                    yield data["response"]
+
+                if data.get("done"):
+                    self._count(requests=1, **self._usage(data))
+                    break
+        finally:
+            resp.close()
+
+    def ping(self):
+        """
+        Cheap liveness check (no generation).
+        """
+        try:
+            resp = http_engine.get("ollama", self.base_url + "/api/version", retries=0, timeout=(1, 2))
+        except requests.exceptions.RequestException:
+            return False
+
+        resp.close()
+        if resp.status_code == 200:
+            self._down_until = 0.0
+            return True
+        return False
+
+    def preload(self):
+        """
+        A generate call without a prompt just loads the model and
+        pins it in memory for keep_alive.
+        """
+        resp = self._post({"model": self.model, "keep_alive": self.keep_alive})
+        resp.close()
+        with self._lock:
+            self._stats["preloaded"] = True
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        s["host"] = self.base_url
+        s["model"] = self.model
+        s["server_down"] = time.time() < self._down_until
+        return s
@@ -1,16 +1,5 @@
-import requests
-import socket
-
-# ------------------------------------
-# CHECK INTERNET
-# ------------------------------------
-
-def has_internet():
-    try:
-        socket.create_connection(("1.1.1.1", 80), timeout=1)
-        return True
-    except:
-        return False
+from connectivity_engine import is_online
+import http_engine
 
 
 # ------------------------------------
@@ -19,7 +8,7 @@ def has_internet():
 
 def get_location_online():
     try:
-        resp = requests.get("https://ipapi.co/json/", timeout=3)
+        resp = http_engine.get("ipapi", "https://ipapi.co/json/")
         data = resp.json()
 
         return {
@@ -55,7 +44,7 @@ def offline_location():
 # ------------------------------------
 
 def get_user_location():
-    if has_internet():
+    if is_online():
         loc = get_location_online()
         if loc:
             return loc
@@ -1,5 +1,8 @@
+import copy
 import json
 import os
+import re
+import store_engine
 from ai_engine import ask_ai, journal_prompt
 
 
@@ -7,6 +10,20 @@ PROFILE_PATH = "data/user_profile.json"
 JOURNEY_PATH = "data/past_journeys.json"
 MEMORY_CACHE_PATH = "data/ai_cache.json"
 
+EMPTY_PROFILE = {
+    "name": "",
+    "traveler_type": "",
+    "gender": "",
+    "interests": [],
+    "budget": "",
+    "last_destination": "",
+    "positive_keywords": [],
+    "negative_keywords": [],
+    "favorite_food": [],
+    "favorite_themes": [],
+    "avoid_themes": []
+}
+
 
 # -----------------------------
 # LOAD/SAVE HELPERS
@@ -20,8 +37,8 @@ def load_json(path):
 
 
 def save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
+    # atomic temp-file + rename, serialized with other writers of `path`
+    store_engine.write(path, data, indent=4)
 
 
 # -----------------------------
@@ -30,23 +47,9 @@ def save_json(path, data):
 
 def update_preferences_from_journal(entry_text):
 
-    sentiment_raw = ask_ai(journal_prompt(entry_text))
-
-    profile = load_json(PROFILE_PATH)
-    if not profile:
-        profile = {
-            "name": "",
-            "traveler_type": "",
-            "gender": "",
-            "interests": [],
-            "budget": "",
-            "last_destination": "",
-            "positive_keywords": [],
-            "negative_keywords": [],
-            "favorite_food": [],
-            "favorite_themes": [],
-            "avoid_themes": []
-        }
+    # the AI call stays outside the profile update so a slow answer
+    # never holds the profile's write lock
+    sentiment_raw = ask_ai(journal_prompt(entry_text), template="journal")
 
     # sentiment_ai format:
     # Sentiment: Positive/Neutral/Negative
@@ -60,7 +63,6 @@ def update_preferences_from_journal(entry_text):
     # -----------------------------------
 
     # We grab emotion keywords
-    import re
     emotion_match = re.search(r"emotion.*?:\s*(.*)", sentiment_lower)
     emotion_words = []
     if emotion_match:
@@ -74,24 +76,30 @@ def update_preferences_from_journal(entry_text):
     # Update memory based on sentiment
     # -----------------------------------
 
-    if "positive" in sentiment_lower:
-        for w in emotion_words:
-            if w not in profile["positive_keywords"]:
-                profile["positive_keywords"].append(w)
+    def apply(profile):
+        if not profile:
+            for key, value in EMPTY_PROFILE.items():
+                profile[key] = list(value) if isinstance(value, list) else value
 
-        if topic and topic not in profile["favorite_themes"]:
-            profile["favorite_themes"].append(topic)
+        if "positive" in sentiment_lower:
+            for w in emotion_words:
+                if w not in profile["positive_keywords"]:
+                    profile["positive_keywords"].append(w)
 
-    if "negative" in sentiment_lower:
-        for w in emotion_words:
-            if w not in profile["negative_keywords"]:
-                profile["negative_keywords"].append(w)
+            if topic and topic not in profile["favorite_themes"]:
+                profile["favorite_themes"].append(topic)
 
-        if topic and topic not in profile["avoid_themes"]:
-            profile["avoid_themes"].append(topic)
+        if "negative" in sentiment_lower:
+            for w in emotion_words:
+                if w not in profile["negative_keywords"]:
+                    profile["negative_keywords"].append(w)
 
-    save_json(PROFILE_PATH, profile)
-    return profile
+            if topic and topic not in profile["avoid_themes"]:
+                profile["avoid_themes"].append(topic)
+
+        return copy.deepcopy(profile)
+
+    return store_engine.update(PROFILE_PATH, apply)
 
 
 # -----------------------------
@@ -135,62 +143,63 @@ Output in structured JSON:
 }}
 """
 
-    ai_response = ask_ai(prompt)
+    ai_response = ask_ai(prompt, template="profile")
 
     # Save enriched memory
     save_json(MEMORY_CACHE_PATH, {"profile_enriched": ai_response})
     return ai_response
 
 def update_memory_from_analysis(analysis):
-    profile = load_json(PROFILE_PATH)
 
-    # Ensure structure exists
-    profile.setdefault("favorite_themes", [])
-    profile.setdefault("avoid_themes", [])
-    profile.setdefault("positive_keywords", [])
-    profile.setdefault("negative_keywords", [])
-    profile.setdefault("likes", [])
-    profile.setdefault("dislikes", [])
-    profile.setdefault("emotional_score_sum", 0)
-    profile.setdefault("emotional_entries", 0)
-
-    # -----------------------------
-    # 1. Update emotional score
-    # -----------------------------
-    profile["emotional_score_sum"] += analysis.get("emotion_score", 0)
-    profile["emotional_entries"] += 1
-
-    # -----------------------------
-    # 2. Add liked themes / activities
-    # -----------------------------
-    for like in analysis.get("likes", []):
-        if like not in profile["likes"]:
-            profile["likes"].append(like)
-
-    for theme in analysis.get("themes", []):
-        if theme not in profile["favorite_themes"]:
-            profile["favorite_themes"].append(theme)
-
-    # -----------------------------
-    # 3. Add disliked areas
-    # -----------------------------
-    for dislike in analysis.get("dislikes", []):
-        if dislike not in profile["dislikes"]:
-            profile["dislikes"].append(dislike)
-            profile["avoid_themes"].append(dislike)
-
-    # -----------------------------
-    # 4. Keywords
-    # -----------------------------
-    for kw in analysis.get("emotion_keywords", []):
-        if analysis.get("emotion_score", 0) > 0:
-            if kw not in profile["positive_keywords"]:
-                profile["positive_keywords"].append(kw)
-        else:
-            if kw not in profile["negative_keywords"]:
-                profile["negative_keywords"].append(kw)
-
-    save_json(PROFILE_PATH, profile)
-    return profile
+    def apply(profile):
+        # Ensure structure exists
+        profile.setdefault("favorite_themes", [])
+        profile.setdefault("avoid_themes", [])
+        profile.setdefault("positive_keywords", [])
+        profile.setdefault("negative_keywords", [])
+        profile.setdefault("likes", [])
+        profile.setdefault("dislikes", [])
+        profile.setdefault("emotional_score_sum", 0)
+        profile.setdefault("emotional_entries", 0)
+
+        # -----------------------------
+        # 1. Update emotional score
+        # -----------------------------
+        profile["emotional_score_sum"] += analysis.get("emotion_score", 0)
+        profile["emotional_entries"] += 1
+
+        # -----------------------------
+        # 2. Add liked themes / activities
+        # -----------------------------
+        for like in analysis.get("likes", []):
+            if like not in profile["likes"]:
+                profile["likes"].append(like)
+
+        for theme in analysis.get("themes", []):
+            if theme not in profile["favorite_themes"]:
+                profile["favorite_themes"].append(theme)
+
+        # -----------------------------
+        # 3. Add disliked areas
+        # -----------------------------
+        for dislike in analysis.get("dislikes", []):
+            if dislike not in profile["dislikes"]:
+                profile["dislikes"].append(dislike)
+                profile["avoid_themes"].append(dislike)
+
+        # -----------------------------
+        # 4. Keywords
+        # -----------------------------
+        for kw in analysis.get("emotion_keywords", []):
+            if analysis.get("emotion_score", 0) > 0:
+                if kw not in profile["positive_keywords"]:
+                    profile["positive_keywords"].append(kw)
+            else:
+                if kw not in profile["negative_keywords"]:
+                    profile["negative_keywords"].append(kw)
+
+        return copy.deepcopy(profile)
+
+    return store_engine.update(PROFILE_PATH, apply)
 
 # END
@@ -0,0 +1,171 @@
+import time
+import heapq
+import itertools
+import threading
+
+
+# ==========================================================
+# PRIORITY WORK QUEUE WITH ADMISSION CONTROL
+# ==========================================================
+# A fixed set of workers drains a priority heap (lower number =
+# more urgent). Before a job is admitted its wait is projected from
+# the work already ahead of it; if that blows the caller's budget
+# (or the queue is full) the job is refused with Overloaded.
+
+
+class Overloaded(Exception):
+
+    def __init__(self, projected_wait, retry_after):
+        super().__init__(f"queue busy: projected wait {projected_wait:.1f}s")
+        self.projected_wait = projected_wait
+        self.retry_after = retry_after
+
+
+class Job:
+
+    def __init__(self, fn, priority):
+        self.fn = fn
+        self.priority = priority
+        self.enqueued = time.time()
+
+        self.cancelled = False
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def cancel(self):
+        """Drops the job if it has not started yet."""
+        self.cancelled = True
+
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError("job still queued or running")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class PriorityWorkQueue:
+
+    def __init__(self, name, workers=1, max_depth=32, expected_service=15.0, alpha=0.3):
+        self.name = name
+        self.workers = workers
+        self.max_depth = max_depth
+        self.alpha = alpha
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._in_service = 0
+        self._started = False
+
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "shed": 0,
+            "ewma_wait": 0.0,
+            "ewma_service": expected_service,
+            "max_wait": 0.0,
+        }
+
+    # ------------------------------------------------------
+    # WORKERS
+    # ------------------------------------------------------
+    def _start(self):
+        if self._started:
+            return
+        self._started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"{self.name}-worker-{i}", daemon=True).start()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._heap)
+
+                if job.cancelled:
+                    self._stats["cancelled"] += 1
+                    job._done.set()
+                    continue
+
+                self._in_service += 1
+                waited = time.time() - job.enqueued
+                self._ewma("ewma_wait", waited)
+                self._stats["max_wait"] = max(self._stats["max_wait"], waited)
+
+            started = time.time()
+            try:
+                job._result = job.fn()
+            except Exception as e:
+                job._error = e
+
+            with self._cond:
+                self._in_service -= 1
+                self._ewma("ewma_service", time.time() - started)
+                self._stats["failed" if job._error else "completed"] += 1
+
+            job._done.set()
+
+    def _ewma(self, key, value):
+        self._stats[key] = (1 - self.alpha) * self._stats[key] + self.alpha * value
+
+    # ------------------------------------------------------
+    # ADMISSION
+    # ------------------------------------------------------
+    def _projected_wait(self, priority):
+        # jobs that will start before this one (same priority is FIFO)
+        ahead = self._in_service + sum(
+            1 for p, _, j in self._heap if p <= priority and not j.cancelled
+        )
+        if ahead < self.workers:
+            return 0.0
+        return (ahead / self.workers) * self._stats["ewma_service"]
+
+    def projected_wait(self, priority):
+        with self._cond:
+            return self._projected_wait(priority)
+
+    def submit(self, fn, priority, budget=None):
+        """
+        budget: seconds the caller can afford to wait in line.
+        Raises Overloaded instead of queueing a job that would not
+        start in time.
+        """
+        with self._cond:
+            projected = self._projected_wait(priority)
+            depth = len(self._heap)
+
+            if depth >= self.max_depth or (budget is not None and projected > budget):
+                self._stats["shed"] += 1
+                raise Overloaded(projected, retry_after=max(1, round(projected)))
+
+            job = Job(fn, priority)
+            heapq.heappush(self._heap, (priority, next(self._seq), job))
+            self._stats["submitted"] += 1
+            self._start()
+            self._cond.notify()
+
+        return job
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            by_priority = {}
+            for p, _, j in self._heap:
+                if not j.cancelled:
+                    by_priority[p] = by_priority.get(p, 0) + 1
+            s["depth"] = sum(by_priority.values())
+            s["depth_by_priority"] = by_priority
+            s["in_service"] = self._in_service
+            s["projected_wait_lowest"] = round(self._projected_wait(float("inf")), 2)
+
+        s["workers"] = self.workers
+        s["max_depth"] = self.max_depth
+        s["ewma_wait"] = round(s["ewma_wait"], 3)
+        s["ewma_service"] = round(s["ewma_service"], 3)
+        s["max_wait"] = round(s["max_wait"], 3)
+        return s
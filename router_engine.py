@@ -0,0 +1,191 @@
+import time
+import threading
+
+
+# ==========================================================
+# LATENCY-AWARE BACKEND ROUTER + CIRCUIT BREAKER
+# ==========================================================
+# Tracks per-backend EWMA latency and error rate, orders the
+# backends by expected time-to-good-answer, and takes a backend
+# out of rotation (circuit "open") after repeated failures. A
+# background thread probes open backends ("half_open") and puts
+# them back once a probe succeeds.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class BackendHealth:
+
+    def __init__(self, name, available, probe, expected_latency):
+        self.name = name
+        self.available = available
+        self.probe = probe
+
+        self.ewma_latency = expected_latency
+        self.ewma_error = 0.0
+
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.consecutive_failures = 0
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.open_seconds = 0.0
+        self.last_error = ""
+
+    def expected_cost(self):
+        # A backend that fails half the time costs roughly twice its
+        # latency (we pay for the failure and then for the fallback).
+        return self.ewma_latency / max(0.05, 1.0 - self.ewma_error)
+
+    def snapshot(self, available):
+        return {
+            "state": self.state,
+            "available": available,
+            "ewma_latency": round(self.ewma_latency, 3),
+            "error_rate": round(self.ewma_error, 3),
+            "expected_cost": round(self.expected_cost(), 3),
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "consecutive_failures": self.consecutive_failures,
+            "reopens_in": round(max(0.0, self.opened_at + self.open_seconds - time.time()), 1)
+                          if self.state == OPEN else 0,
+            "last_error": self.last_error,
+        }
+
+
+class BackendRouter:
+
+    def __init__(self, alpha=0.3, failure_threshold=3, open_seconds=30,
+                 max_open_seconds=300, probe_interval=5):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.probe_interval = probe_interval
+
+        self._backends = {}
+        self._lock = threading.Lock()
+        self._prober = None
+
+    def register(self, name, available=None, probe=None, expected_latency=5.0):
+        """
+        available()  → bool, cheap check that the backend can be tried at all
+        probe()      → bool, small real request used while half-open
+        """
+        self._backends[name] = BackendHealth(
+            name,
+            available or (lambda: True),
+            probe,
+            expected_latency
+        )
+
+    # ------------------------------------------------------
+    # ROUTING
+    # ------------------------------------------------------
+    def order(self):
+        """
+        Backends worth trying, cheapest expected first. Open and
+        half-open circuits are skipped unless nothing else is available.
+        """
+        usable = [b for b in self._backends.values() if b.available()]
+
+        with self._lock:
+            closed = [b for b in usable if b.state == CLOSED]
+            pool = closed or usable
+
+            return [b.name for b in sorted(pool, key=lambda b: b.expected_cost())]
+
+    def record(self, name, latency, ok, timeout=False, error=""):
+        """
+        latency=None records the outcome without touching the latency
+        average (used for probes, which are much cheaper than real calls).
+        """
+        with self._lock:
+            b = self._backends[name]
+            a = self.alpha
+
+            b.calls += 1
+            if latency is not None:
+                b.ewma_latency = (1 - a) * b.ewma_latency + a * latency
+            b.ewma_error = (1 - a) * b.ewma_error + a * (0.0 if ok else 1.0)
+
+            if ok:
+                b.consecutive_failures = 0
+                if b.state != CLOSED:
+                    b.state = CLOSED
+                    b.open_seconds = 0.0
+                return
+
+            b.errors += 1
+            b.timeouts += 1 if timeout else 0
+            b.consecutive_failures += 1
+            b.last_error = error[:200]
+
+            # only trip a closed circuit or a failed probe; failures that
+            # arrive while already open must not keep extending the wait
+            if b.state == HALF_OPEN or (b.state == CLOSED and b.consecutive_failures >= self.failure_threshold):
+                self._open(b)
+
+        self._ensure_prober()
+
+    def _open(self, b):
+        # Back off harder each time the same backend re-trips
+        if b.state == CLOSED or not b.open_seconds:
+            b.open_seconds = self.base_open_seconds
+        else:
+            b.open_seconds = min(self.max_open_seconds, b.open_seconds * 2)
+
+        b.state = OPEN
+        b.opened_at = time.time()
+
+    # ------------------------------------------------------
+    # HALF-OPEN PROBING
+    # ------------------------------------------------------
+    def _ensure_prober(self):
+        with self._lock:
+            if self._prober is None:
+                self._prober = threading.Thread(target=self._probe_loop, name="ai-router-probe", daemon=True)
+                self._prober.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.probe_interval)
+
+            # available() may hit the connectivity probe — keep it outside the lock
+            available = {name: b.available() for name, b in self._backends.items()}
+
+            now = time.time()
+            with self._lock:
+                due = [
+                    b for b in self._backends.values()
+                    if b.state == OPEN and now - b.opened_at >= b.open_seconds and available[b.name]
+                ]
+                for b in due:
+                    b.state = HALF_OPEN
+
+            for b in due:
+                try:
+                    ok = bool(b.probe()) if b.probe else True
+                    error = "" if ok else "probe failed"
+                except Exception as e:
+                    ok, error = False, str(e)
+
+                self.record(b.name, None, ok, error=error)
+
+    def snapshot(self):
+        # available() may hit the connectivity probe — keep it outside the lock
+        available = {name: bool(b.available()) for name, b in self._backends.items()}
+
+        with self._lock:
+            backends = {name: b.snapshot(available[name]) for name, b in self._backends.items()}
+
+        return {
+            "order": self.order(),
+            "failure_threshold": self.failure_threshold,
+            "backends": backends,
+        }
@@ -1,20 +1,8 @@
 import json
-import os
-import requests
-import socket
-from ai_engine import ask_ai, safety_prompt
-
-
-# ---------------------------------------------------
-# INTERNET CHECK
-# ---------------------------------------------------
-
-def has_internet():
-    try:
-        socket.create_connection(("1.1.1.1", 80), timeout=1)
-        return True
-    except:
-        return False
+from ai_engine import ask_ai, safety_prompt, run_parallel, AI_TIMEOUT_TEXT
+from connectivity_engine import is_online
+from catalog_engine import catalog
+import http_engine
 
 
 # ---------------------------------------------------
@@ -22,14 +10,8 @@ def has_internet():
 # ---------------------------------------------------
 
 def load_safety_local():
-    path = os.path.join("data", "safety.json")
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
-
-
-local_safety_data = load_safety_local()
+    # shared, hot-reloaded copy (edits to data/safety.json apply live)
+    return catalog.get("safety.json", [])
 
 
 # ---------------------------------------------------
@@ -37,7 +19,7 @@ local_safety_data = load_safety_local()
 # ---------------------------------------------------
 
 def get_local_safety(location):
-    for entry in local_safety_data:
+    for entry in load_safety_local():
         if entry["location"].lower() == location.lower():
             return entry
     return None
@@ -49,14 +31,14 @@ def get_local_safety(location):
 # ---------------------------------------------------
 
 def get_online_alerts(location):
-    if not has_internet():
+    if not is_online():
         return None
 
     try:
         url = f"https://gnews.io/api/v4/search?q={location}+travel+safety&lang=en&max=5&token=demo"
         # NOTE: token=demo returns limited free sample — offline fallback handles the rest
         
-        r = requests.get(url, timeout=4)
+        r = http_engine.get("gnews", url)
         data = r.json()
 
         if "articles" in data:
@@ -78,7 +60,20 @@ def get_online_alerts(location):
 # AI-BASED SAFETY ASSESSMENT
 # ---------------------------------------------------
 
-def ai_safety_analysis(location, gender, traveler_type):
+def unknown_analysis(why):
+    """Same shape as a parsed AI answer, for when there isn't one."""
+    return {
+        "risk_level": "Unknown",
+        "why": why,
+        "safe_areas": [],
+        "avoid_areas": [],
+        "gender_specific_tips": [],
+        "solo_traveler_mode": [],
+        "emergency_guidance": "Contact nearest embassy"
+    }
+
+
+def ai_safety_analysis(location, gender, traveler_type, deadline=None, hedge_after=None):
     """
     Adds AI interpretation: safety level, areas to avoid,
     gender-specific tips, emergency guidance.
@@ -104,28 +99,20 @@ Provide structured JSON:
 }}
 """
 
-    response = ask_ai(prompt)
+    response = ask_ai(prompt, template="safety", deadline=deadline, hedge_after=hedge_after)
 
     # fallback if AI doesn't return valid JSON
     try:
         return json.loads(response)
     except:
-        return {
-            "risk_level": "Unknown",
-            "why": response,
-            "safe_areas": [],
-            "avoid_areas": [],
-            "gender_specific_tips": [],
-            "solo_traveler_mode": [],
-            "emergency_guidance": "Contact nearest embassy"
-        }
+        return unknown_analysis(response)
 
 
 # ---------------------------------------------------
 # EMERGENCY AI MODE
 # ---------------------------------------------------
 
-def ai_emergency_help(situation, location):
+def ai_emergency_help(situation, location, deadline=None, hedge_after=None):
     prompt = f"""
 You are Triptide Emergency Assistant.
 
@@ -142,24 +129,32 @@ Provide concise emergency instructions:
 - If offline: what to do
 """
 
-    return ask_ai(prompt)
+    return ask_ai(prompt, template="emergency", deadline=deadline, hedge_after=hedge_after)
 
 
 # ---------------------------------------------------
 # COMBINED SAFETY ENGINE
 # ---------------------------------------------------
 
-def safety_engine(location, gender, traveler_type):
+def safety_engine(location, gender, traveler_type, deadline=None, hedge_after=None):
     """
     Main safety function combining:
     - Local safety DB
     - AI safety interpretation
     - Online alerts (if available)
+
+    deadline bounds the AI call (hedged, see ask_ai); the news
+    lookup is dropped if it is still running by then.
     """
 
     local = get_local_safety(location)
-    ai_result = ai_safety_analysis(location, gender, traveler_type)
-    online_alerts = get_online_alerts(location)
+
+    # AI analysis and news lookup are independent → run side by side
+    ai_result, online_alerts = run_parallel([
+        (ai_safety_analysis, (location, gender, traveler_type, deadline, hedge_after)),
+        (get_online_alerts, (location,)),
+    ], deadline=deadline + 0.5 if deadline is not None else None,
+       fallbacks=[unknown_analysis(AI_TIMEOUT_TEXT), None])
 
     return {
         "local_data": local,
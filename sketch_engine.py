@@ -0,0 +1,147 @@
+import math
+
+
+# ==========================================================
+# MERGEABLE QUANTILE SKETCH (DDSKETCH-STYLE)
+# ==========================================================
+# Values land in logarithmic buckets: bucket i covers
+# (gamma^(i-1), gamma^i], so any quantile is reported within
+# RELATIVE_ACCURACY of the true value. Memory is capped at MAX_BINS
+# buckets (the lowest buckets are collapsed first), and two sketches
+# merge by adding bucket counts — so per-worker or per-minute sketches
+# can be combined into hourly / global ones.
+#
+# Sketches are plain JSON-able dicts so they can live inside the
+# analytics snapshot:
+#   {"count", "sum", "min", "max", "zero", "bins": {"<index>": n}}
+
+RELATIVE_ACCURACY = 0.01
+MAX_BINS = 512
+
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+# values at or below this count as zero (scroll depth 0, instant loads)
+MIN_VALUE = 1e-6
+
+
+def new_sketch():
+    return {"count": 0, "sum": 0, "min": None, "max": None, "zero": 0, "bins": {}}
+
+
+def _index(value):
+    return int(math.ceil(math.log(value) / LOG_GAMMA))
+
+
+def _value(index):
+    # midpoint (in relative terms) of bucket `index`
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+def _collapse(sketch):
+    bins = sketch["bins"]
+    if len(bins) <= MAX_BINS:
+        return
+
+    keys = sorted(bins, key=int)
+    extra = len(keys) - MAX_BINS
+    # fold the lowest buckets into the first one we keep
+    target = keys[extra]
+    for k in keys[:extra]:
+        bins[target] += bins.pop(k)
+
+
+def add(sketch, values):
+    """
+    Adds numbers to the sketch in place (non-numbers, NaN and ±inf are
+    ignored).
+    Negative values are clamped to zero.
+    """
+    bins = sketch["bins"]
+    for v in values:
+        if not isinstance(v, (int, float)) or isinstance(v, bool) or not math.isfinite(v):
+            continue
+
+        sketch["count"] += 1
+        sketch["sum"] += v
+        sketch["min"] = v if sketch["min"] is None else min(sketch["min"], v)
+        sketch["max"] = v if sketch["max"] is None else max(sketch["max"], v)
+
+        if v <= MIN_VALUE:
+            sketch["zero"] += 1
+            continue
+
+        k = str(_index(v))
+        bins[k] = bins.get(k, 0) + 1
+
+    _collapse(sketch)
+    return sketch
+
+
+def merge(into, other):
+    """
+    Adds `other` into `into` in place.
+    """
+    if not other or not other.get("count"):
+        return into
+
+    into["count"] += other["count"]
+    into["sum"] += other["sum"]
+    into["zero"] += other.get("zero", 0)
+
+    for key in ("min", "max"):
+        pick = min if key == "min" else max
+        if into[key] is None:
+            into[key] = other[key]
+        elif other[key] is not None:
+            into[key] = pick(into[key], other[key])
+
+    bins = into["bins"]
+    for k, n in other["bins"].items():
+        bins[k] = bins.get(k, 0) + n
+
+    _collapse(into)
+    return into
+
+
+def merged(sketches):
+    out = new_sketch()
+    for s in sketches:
+        merge(out, s)
+    return out
+
+
+def quantile(sketch, q):
+    count = sketch.get("count", 0)
+    if not count:
+        return None
+
+    rank = q * (count - 1)
+    if rank < sketch["zero"]:
+        return 0
+
+    seen = sketch["zero"]
+    for k in sorted(sketch["bins"], key=int):
+        seen += sketch["bins"][k]
+        if seen > rank:
+            # never report outside the observed range
+            return min(max(_value(int(k)), sketch["min"]), sketch["max"])
+
+    return sketch["max"]
+
+
+def summary(sketch, quantiles=(0.5, 0.9, 0.99)):
+    """
+    {"count", "mean", "min", "max", "p50", "p90", "p99"} rounded for display.
+    """
+    count = sketch.get("count", 0)
+    out = {
+        "count": count,
+        "mean": round(sketch["sum"] / count, 2) if count else None,
+        "min": round(sketch["min"], 2) if count else None,
+        "max": round(sketch["max"], 2) if count else None,
+    }
+    for q in quantiles:
+        v = quantile(sketch, q)
+        out[f"p{int(q * 100)}"] = round(v, 2) if v is not None else None
+    return out
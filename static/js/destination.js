@@ -45,32 +45,27 @@ async function loadSafety(place) {
         `<p><strong>Safety Score:</strong> ${data.score}</p>`;
 }
 
-// CULTURE
+// CULTURE (streamed)
 async function loadCulture(place) {
-    let res = await fetch(`/api/culture`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ destination: place })
-    });
-    let data = await res.json();
-    document.getElementById("culture_box").innerHTML = data.story;
+    const box = document.getElementById("culture_box");
+    box.innerHTML = "⏳ Loading...";
+
+    await streamAI(`/api/culture/stream`, { destination: place },
+        partial => { box.textContent = partial; });
 }
 
-// PACKING
+// PACKING (streamed)
 async function loadPacking(place) {
-    let res = await fetch(`/api/packing`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-            destination: place,
-            climate: "tropical",
-            duration: 4,
-            activities: ["tourism"],
-            traveler_type: "Solo"
-        })
-    });
-    let data = await res.json();
-    document.getElementById("packing_box").innerHTML = data.packing_list;
+    const box = document.getElementById("packing_box");
+    box.innerHTML = "⏳ Loading...";
+
+    await streamAI(`/api/packing/stream`, {
+        destination: place,
+        climate: "tropical",
+        duration: 4,
+        activities: ["tourism"],
+        traveler_type: "Solo"
+    }, partial => { box.textContent = partial; });
 }
 
 // EXPERIENCES
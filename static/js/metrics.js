@@ -0,0 +1,94 @@
+// Client-side analytics batching.
+// Events are queued in memory and sent to /api/metrics/batch in one
+// request every FLUSH_MS, when the queue gets long, and when the page
+// is hidden / unloaded (navigator.sendBeacon survives navigation).
+//
+//   TripMetrics.track("click", { event: "Plan Trip" });
+//   TripMetrics.track("ctr", { label: "view_stay", clicked: 1 });
+//
+// Page visits, load time and max scroll depth are tracked automatically;
+// elements with data-track="name" log a click when clicked.
+(function () {
+    const ENDPOINT = "/api/metrics/batch";
+    const FLUSH_MS = 15000;
+    const MAX_QUEUE = 50;
+    const PROFILE_KEY = "triptide_profile";
+
+    let queue = [];
+    let maxScroll = 0;
+    let scrollSent = false;
+    const page = window.location.pathname;
+
+    function currentUser() {
+        try {
+            const profile = JSON.parse(localStorage.getItem(PROFILE_KEY) || "{}");
+            return profile.user_id || "anonymous";
+        } catch (e) {
+            return "anonymous";
+        }
+    }
+
+    function track(type, fields) {
+        // ts = when it happened; the batch may reach the server much later
+        queue.push(Object.assign({ type: type, ts: Date.now() / 1000 }, fields || {}));
+        if (queue.length >= MAX_QUEUE) flush();
+    }
+
+    function flush() {
+        if (!queue.length) return;
+
+        const body = JSON.stringify({ user: currentUser(), events: queue });
+        queue = [];
+
+        const blob = new Blob([body], { type: "application/json" });
+        if (navigator.sendBeacon && navigator.sendBeacon(ENDPOINT, blob)) return;
+
+        // Beacon unavailable or refused (payload too large) → keepalive fetch
+        fetch(ENDPOINT, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: body,
+            keepalive: true
+        }).catch(err => console.log("Metrics flush failed:", err));
+    }
+
+    function recordScroll() {
+        const doc = document.documentElement;
+        const height = doc.scrollHeight - window.innerHeight;
+        const depth = height > 0 ? Math.round((window.scrollY / height) * 100) : 100;
+        if (depth > maxScroll) maxScroll = Math.min(100, depth);
+    }
+
+    function onHide() {
+        if (!scrollSent) {
+            track("scroll", { page: page, value: maxScroll });
+            scrollSent = true;
+        }
+        flush();
+    }
+
+    track("page", { page: page });
+
+    window.addEventListener("load", () => {
+        const nav = performance.getEntriesByType && performance.getEntriesByType("navigation")[0];
+        const loadTime = nav && nav.loadEventStart > 0 ? nav.loadEventStart : performance.now();
+        track("load_time", { page: page, value: Math.round(loadTime) });
+        recordScroll();
+    });
+
+    window.addEventListener("scroll", recordScroll, { passive: true });
+
+    document.addEventListener("click", e => {
+        const el = e.target.closest && e.target.closest("[data-track]");
+        if (el) track("click", { event: el.dataset.track });
+    });
+
+    document.addEventListener("visibilitychange", () => {
+        if (document.visibilityState === "hidden") onHide();
+    });
+    window.addEventListener("pagehide", onHide);
+
+    setInterval(flush, FLUSH_MS);
+
+    window.TripMetrics = { track: track, flush: flush };
+})();
@@ -9,22 +9,20 @@ async function generateItinerary() {
         return;
     }
 
-    document.getElementById("itinerary_output").innerHTML =
-        "⏳ Generating itinerary...";
+    const output = document.getElementById("itinerary_output");
+    output.innerHTML = "⏳ Generating itinerary...";
 
-    const res = await fetch("/api/itinerary", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
+    try {
+        // Render tokens as they arrive instead of waiting for the full plan
+        const text = await streamAI("/api/itinerary/stream", {
             destination: dest,
             days,
             traveler_type: type,
             interests
-        })
-    });
+        }, partial => { output.textContent = partial; });
 
-    const data = await res.json();
-
-    document.getElementById("itinerary_output").innerHTML =
-        data.itinerary || "❌ Unable to generate itinerary.";
+        if (!text) output.innerHTML = "❌ Unable to generate itinerary.";
+    } catch (e) {
+        output.innerHTML = "❌ Unable to generate itinerary.";
+    }
 }
@@ -0,0 +1,46 @@
+// Reads a POST Server-Sent Events stream from the AI endpoints
+// (/api/itinerary/stream, /api/packing/stream, /api/culture/stream).
+// onToken(fullTextSoFar) fires on every chunk; resolves with the full text.
+async function streamAI(url, body, onToken) {
+    const res = await fetch(url, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body)
+    });
+
+    if (!res.ok || !res.body) {
+        throw new Error("Stream failed: " + res.status);
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let text = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE events are separated by a blank line
+        let sep;
+        while ((sep = buffer.indexOf("\n\n")) !== -1) {
+            const raw = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+
+            if (raw.startsWith("event: done")) return text;
+
+            const line = raw.split("\n").find(l => l.startsWith("data: "));
+            if (!line) continue;
+
+            const payload = JSON.parse(line.slice(6));
+            if (payload.token) {
+                text += payload.token;
+                onToken(text);
+            }
+        }
+    }
+
+    return text;
+}
@@ -0,0 +1,253 @@
+import os
+import copy
+import json
+import time
+import threading
+
+
+# ==========================================================
+# DOCUMENT STORE (ATOMIC, LOCKED, GROUP-COMMITTED JSON FILES)
+# ==========================================================
+# write(path, data)      → replace the whole document atomically
+# update(path, fn)       → read-modify-write: fn(doc) changes doc in
+#                          place (or returns a new document via
+#                          Replace) and its return value is handed back
+# read(path)             → mutable copy of the current document
+#
+# Every write goes to a temp file in the same folder, is fsynced and
+# then renamed over the original, so readers see either the old or the
+# new file, never a half-written one. Writers of the same document are
+# serialized by a per-document lock. write() and update() calls that
+# arrive while a commit for that document is in progress queue up and
+# are applied in order by the next commit: one read, N changes, one
+# fsync (a burst of whole-document writes → the last one wins).
+#
+# The thread that starts a commit (the leader) writes at most MAX_GROUP
+# updates per commit and MAX_ROUNDS commits; if more are still queued it
+# hands the lead to the oldest waiting caller and returns, so a steady
+# stream of writers can't keep one request waiting forever.
+
+GROUP_WINDOW = 0.002   # seconds the committing thread waits for stragglers
+MAX_GROUP = 64         # updates applied per commit
+MAX_ROUNDS = 4         # commits one leader runs before handing off
+
+
+class Replace:
+    """Return Replace(new_doc) from an update fn to swap the whole document."""
+
+    def __init__(self, value, result=None):
+        self.value = value
+        self.result = result
+
+
+class _Request:
+    __slots__ = ("fn", "value", "done", "finished", "result", "error")
+
+    def __init__(self, fn, value=None):
+        self.fn = fn          # None → whole-document write of value
+        self.value = value
+        self.done = threading.Event()   # set when finished or promoted to leader
+        self.finished = False
+        self.result = None
+        self.error = None
+
+
+class _Document:
+
+    def __init__(self):
+        self.lock = threading.Lock()         # guards pending / committing
+        self.write_lock = threading.Lock()   # one writer on disk at a time
+        self.pending = []
+        self.committing = False
+
+
+class DocumentStore:
+
+    def __init__(self, group_window=GROUP_WINDOW, on_write=None):
+        self.group_window = group_window
+        self.on_write = on_write   # callback(path) after every commit
+
+        self._docs = {}
+        self._docs_lock = threading.Lock()
+        self._stats = {"writes": 0, "updates": 0, "grouped": 0, "commits": 0, "max_group": 0, "fsync_ms": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _doc(self, path):
+        key = os.path.abspath(path)
+        with self._docs_lock:
+            doc = self._docs.get(key)
+            if doc is None:
+                doc = self._docs[key] = _Document()
+            return doc
+
+    # ------------------------------------------------------
+    # FILE I/O
+    # ------------------------------------------------------
+    @staticmethod
+    def _read_file(path, default):
+        if not os.path.exists(path):
+            return copy.deepcopy(default)
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_file(self, path, data, indent):
+        folder = os.path.dirname(path) or "."
+        os.makedirs(folder, exist_ok=True)
+
+        tmp = os.path.join(folder, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+        started = time.time()
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=indent)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        with self._stats_lock:
+            self._stats["fsync_ms"] += (time.time() - started) * 1000
+
+    # ------------------------------------------------------
+    # PUBLIC API
+    # ------------------------------------------------------
+    def read(self, path, default=None):
+        return self._read_file(path, {} if default is None else default)
+
+    def write(self, path, data, indent=4):
+        """Replaces the whole document; committed with any queued updates."""
+        with self._stats_lock:
+            self._stats["writes"] += 1
+        self._submit(path, _Request(None, data), {}, indent)
+
+    def update(self, path, fn, default=None, indent=4):
+        """
+        Applies fn to the current document and commits it. Returns
+        fn's result; an exception from fn is re-raised here and that
+        fn's changes are not written (the rest of the group still is).
+        """
+        with self._stats_lock:
+            self._stats["updates"] += 1
+        return self._submit(path, _Request(fn), {} if default is None else default, indent)
+
+    def _submit(self, path, req, default, indent):
+        doc = self._doc(path)
+
+        with doc.lock:
+            doc.pending.append(req)
+            leader = not doc.committing
+            doc.committing = True
+
+        if not leader:
+            req.done.wait()
+            leader = not req.finished   # woken to take over the lead
+
+        if leader:
+            self._commit_loop(path, doc, default, indent)
+
+        if req.error is not None:
+            raise req.error
+        return req.result
+
+    def _commit_loop(self, path, doc, default, indent):
+        if self.group_window:
+            time.sleep(self.group_window)
+
+        for _ in range(MAX_ROUNDS):
+            with doc.lock:
+                batch, doc.pending = doc.pending[:MAX_GROUP], doc.pending[MAX_GROUP:]
+                if not batch:
+                    doc.committing = False
+                    return
+
+            written = False
+            with doc.write_lock:
+                try:
+                    data = self._apply(lambda: self._read_file(path, default), batch)
+                    self._write_file(path, data, indent)
+                    written = True
+                except Exception as e:
+                    for req in batch:
+                        if req.error is None:
+                            req.error = e
+
+            # the file is already committed: a failing callback is not
+            # the callers' error
+            if written and self.on_write is not None:
+                try:
+                    self.on_write(path)
+                except Exception as e:
+                    print("STORE ON_WRITE ERROR:", e)
+
+            with self._stats_lock:
+                self._stats["commits"] += 1
+                self._stats["grouped"] += len(batch)
+                self._stats["max_group"] = max(self._stats["max_group"], len(batch))
+
+            for req in batch:
+                req.finished = True
+                req.done.set()
+
+        # out of rounds: the oldest waiter leads the rest
+        with doc.lock:
+            if doc.pending:
+                doc.pending[0].done.set()
+            else:
+                doc.committing = False
+
+    @staticmethod
+    def _run(req, data):
+        if req.fn is None:
+            return req.value
+        result = req.fn(data)
+        if isinstance(result, Replace):
+            data, result = result.value, result.result
+        req.result = result
+        return data
+
+    def _apply(self, load, batch):
+        """
+        Applies the batch's fns in order to one loaded document. The file
+        on disk still holds the pre-batch state, so when a fn raises, that
+        fn is dropped, the document is re-read and the rest replayed — no
+        per-update copy on the happy path. A batch that starts with a
+        whole-document write doesn't read the file at all.
+        """
+        todo = list(batch)
+        while True:
+            data = None if todo and todo[0].fn is None else load()
+            for i, req in enumerate(todo):
+                try:
+                    data = self._run(req, data)
+                except Exception as e:
+                    req.error = e
+                    del todo[i]
+                    break
+            else:
+                return data
+
+    def stats(self):
+        with self._stats_lock:
+            s = dict(self._stats)
+        s["fsync_ms"] = round(s["fsync_ms"], 2)
+        s["avg_group"] = round(s["grouped"] / s["commits"], 2) if s["commits"] else 0
+        with self._docs_lock:
+            s["documents"] = len(self._docs)
+        return s
+
+
+store = DocumentStore()
+
+
+def read(path, default=None):
+    return store.read(path, default)
+
+
+def write(path, data, indent=4):
+    store.write(path, data, indent)
+
+
+def update(path, fn, default=None, indent=4):
+    return store.update(path, fn, default, indent)
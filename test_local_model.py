@@ -0,0 +1,182 @@
+import os
+import sys
+import json
+import socket
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import ai_engine
+import local_model_engine
+
+
+# ==========================================================
+# STUB OLLAMA SERVER
+# ==========================================================
+# Serves just enough of the Ollama HTTP API for LocalModelClient:
+# /api/generate (one JSON object, or NDJSON when "stream" is true)
+# and /api/version. Every generate body is kept for the asserts.
+
+STREAM_CHUNKS = ["Hello", " from", " the stub"]
+
+
+class StubOllama(BaseHTTPRequestHandler):
+
+    def _send(self, status, body, content_type="application/json"):
+        raw = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self._send(200, json.dumps({"version": "0.0.0-stub"}))
+        else:
+            self._send(404, json.dumps({"error": "not found"}))
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._send(404, json.dumps({"error": "not found"}))
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        self.server.bodies.append(body)
+
+        if "prompt" not in body:
+            # preload: load the model, generate nothing
+            self._send(200, json.dumps({"model": body["model"], "response": "", "done": True}))
+        elif body.get("stream"):
+            lines = [{"response": c, "done": False} for c in STREAM_CHUNKS]
+            lines.append({"response": "", "done": True, "prompt_eval_count": 7, "eval_count": 3})
+            self._send(200, "".join(json.dumps(l) + "\n" for l in lines), "application/x-ndjson")
+        else:
+            self._send(200, json.dumps({
+                "response": "  Hello from the stub  ",
+                "done": True,
+                "prompt_eval_count": 12,
+                "eval_count": 5,
+            }))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllama)
+    server.bodies = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    host = "http://127.0.0.1:%d" % server.server_address[1]
+    monkeypatch.setenv("OLLAMA_HOST", host)
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def _closed_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+# ----------------------------
+# Client against the stub
+# ----------------------------
+def _client(**kwargs):
+    return local_model_engine.LocalModelClient("stub-model", host=os.environ["OLLAMA_HOST"], **kwargs)
+
+
+def test_host_comes_from_env(stub_server):
+    # OLLAMA_HOST is read at import time, so check it in a fresh interpreter
+    out = subprocess.run(
+        [sys.executable, "-c", "import local_model_engine as m; print(m.LocalModelClient('x').base_url)"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=os.environ.copy(),
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    assert out.stdout.decode().strip() == os.environ["OLLAMA_HOST"]
+    assert _client().ping() is True
+
+
+def test_generate_returns_text_and_token_counts(stub_server):
+    client = _client(keep_alive="5m")
+
+    result = client.generate("hi")
+
+    assert result == {"text": "Hello from the stub", "prompt_tokens": 12, "completion_tokens": 5}
+
+    body = stub_server.bodies[-1]
+    assert body["model"] == "stub-model"
+    assert body["prompt"] == "hi"
+    assert body["stream"] is False
+    assert body["keep_alive"] == "5m"
+
+    stats = client.stats()
+    assert stats["requests"] == 1
+    assert stats["prompt_tokens"] == 12
+    assert stats["completion_tokens"] == 5
+
+
+def test_stream_yields_chunks_and_counts_tokens(stub_server):
+    client = _client(keep_alive="5m")
+
+    chunks = list(client.stream("hi"))
+
+    assert chunks == STREAM_CHUNKS
+    assert stub_server.bodies[-1]["stream"] is True
+    assert stub_server.bodies[-1]["keep_alive"] == "5m"
+
+    stats = client.stats()
+    assert stats["prompt_tokens"] == 7
+    assert stats["completion_tokens"] == 3
+
+
+def test_preload_sends_keep_alive_without_prompt(stub_server):
+    client = _client(keep_alive="30m")
+
+    client.preload()
+
+    assert stub_server.bodies[-1] == {"model": "stub-model", "keep_alive": "30m"}
+    assert client.stats()["preloaded"] is True
+
+
+# ----------------------------
+# Unreachable server → CLI
+# ----------------------------
+def test_unreachable_host_raises_unavailable():
+    client = local_model_engine.LocalModelClient("stub-model", host="127.0.0.1:%d" % _closed_port())
+
+    with pytest.raises(local_model_engine.LocalModelUnavailable):
+        client.generate("hi")
+    assert client.stats()["server_down"] is True
+    assert client.ping() is False
+
+
+def test_unreachable_host_falls_back_to_subprocess(monkeypatch):
+    client = ai_engine.LocalModelClient(ai_engine.LOCAL_MODEL, host="127.0.0.1:%d" % _closed_port())
+    monkeypatch.setattr(ai_engine, "local_client", client)
+
+    calls = []
+
+    class Done:
+        stdout = b"hello from the cli\n"
+
+    def fake_run(cmd, **kwargs):
+        calls.append((cmd, kwargs["input"]))
+        return Done()
+
+    monkeypatch.setattr(ai_engine.subprocess, "run", fake_run)
+
+    assert ai_engine.local_ai("hi") == "hello from the cli"
+    assert calls == [(["ollama", "run", ai_engine.LOCAL_MODEL], b"hi")]
@@ -1,26 +1,11 @@
-import requests
-import socket
-import json
-import os
+from connectivity_engine import is_online
+from catalog_engine import catalog
+import http_engine
 
 
 # Load offline weather fallback
 def load_defaults():
-    path = os.path.join("data", "weather_defaults.json")
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
-defaults = load_defaults()
-
-
-def has_internet():
-    try:
-        socket.create_connection(("1.1.1.1", 80), timeout=1)
-        return True
-    except:
-        return False
+    return catalog.get("weather_defaults.json", {})
 
 
 # -------- ONLINE WEATHER (REALTIME via Open-Meteo) --------
@@ -32,7 +17,7 @@ def get_weather_online(lat, lon):
             f"latitude={lat}&longitude={lon}&current_weather=true"
         )
 
-        resp = requests.get(url, timeout=3)
+        resp = http_engine.get("open-meteo", url)
         data = resp.json()
 
         temp = data["current_weather"]["temperature"]
@@ -69,6 +54,7 @@ def get_weather_online(lat, lon):
 # -------- OFFLINE WEATHER BACKUP --------
 
 def offline_weather():
+    defaults = load_defaults()
     return {
         "temp": defaults.get("fallback_temp", 28),
         "wind": 5,
@@ -79,7 +65,7 @@ def offline_weather():
 # -------- MAIN WEATHER ACCESS --------
 
 def get_weather(lat, lon):
-    if has_internet():
+    if is_online():
         online = get_weather_online(lat, lon)
         if online:
             return online